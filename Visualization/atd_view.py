@@ -18,6 +18,52 @@ sys.path.append('..')
 from trajectory import get_trajectory_list_for_plot,get_md_point,get_tl_dls_lpdis_kop, get_sliding_rate
 import unit_conversion_utility as unit_util
 
+# Units displayed for the metric (True) and the English (False) unit systems, the data being kept in SI
+LENGTH_UNIT_DICT = {True: "m", False: "ft"}
+DLS_UNIT_DICT = {True: "deg/30m", False: "deg/100ft"}
+
+
+def set_axis_labels(plot_v, plot_h, is_metric_unit):
+    length_unit = LENGTH_UNIT_DICT[is_metric_unit]
+    plot_v.xaxis.axis_label = 'vsec (' + length_unit + ')'
+    plot_v.yaxis.axis_label = 'tvd (' + length_unit + ')'
+    plot_h.xaxis.axis_label = 'ew (' + length_unit + ')'
+    plot_h.yaxis.axis_label = 'ns (' + length_unit + ')'
+
+
+def get_plot_full_data(plot_data_si, kpi_names, kpi_values, is_metric_unit):
+    # All the trajectories in one vectorised pass
+    if is_metric_unit:
+        plot_data = dict(plot_data_si)
+    else:
+        convert = unit_util.conversion_function("m", LENGTH_UNIT_DICT[is_metric_unit])
+        plot_data = {key: unit_util.convert_array_list(convert, value) for key, value in plot_data_si.items()}
+
+    # Set sources needed by hover
+    dict_hover = dict()
+    for idx in range(len(kpi_names)):
+        dict_hover[kpi_names[idx]] = []
+        for i in range(len(kpi_values)):
+            dict_hover[kpi_names[idx]].append(kpi_values[i][idx])
+
+    v_full_data = {**dict(vsec=plot_data['vsec'], tvd=plot_data['tvd']), **dict_hover}
+    h_full_data = {**dict(ew=plot_data['ew'], ns=plot_data['ns']), **dict_hover}
+    return v_full_data, h_full_data
+
+
+def convert_source_data(data, unit_pair_dict):
+    # Convert the columns named in unit_pair_dict, as name: (from unit, to unit), of the data of a source
+    converted_data = dict(data)
+    for key, (from_unit, to_unit) in unit_pair_dict.items():
+        if key not in data or len(data[key]) == 0:
+            continue
+        if np.ndim(data[key][0]) == 0:
+            converted_data[key] = unit_util.convert(data[key], from_unit, to_unit).tolist()
+        else:
+            converted_data[key] = unit_util.convert_array_list(unit_util.conversion_function(from_unit, to_unit),
+                                                               data[key])
+    return converted_data
+
 
 def define_plots(original_traj_data, trajectories, kpi_names, kpi_values, is_metric_unit, azi):
     hover = HoverTool(tooltips=[])
@@ -38,44 +84,22 @@ def define_plots(original_traj_data, trajectories, kpi_names, kpi_values, is_met
     plot_h.add_tools(hover)
     # plot_h.toolbar.active_inspect = None  # Inactive hover in toolbar
 
-    if is_metric_unit:
-        plot_v.xaxis.axis_label = 'vsec (m)'
-        plot_v.yaxis.axis_label = 'tvd (m)'
-        plot_h.xaxis.axis_label = 'ew (m)'
-        plot_h.yaxis.axis_label = 'ns (m)'
-    else:
-        plot_v.xaxis.axis_label = 'vsec (ft)'
-        plot_v.yaxis.axis_label = 'tvd (ft)'
-        plot_h.xaxis.axis_label = 'ew (ft)'
-        plot_h.yaxis.axis_label = 'ns (ft)'
+    set_axis_labels(plot_v, plot_h, is_metric_unit)
 
     vsec_list = []
     tvd_list = []
     ew_list = []
     ns_list = []
-    dict_hover = dict()
     for i in range(len(trajectories)):
         md, tvd, ns, ew, vsec = get_trajectory_list_for_plot(trajectory_dict_list = trajectories[i]['Stations'],azimuth = azi) ##use trajectory
-        if is_metric_unit:
-            vsec_list.append(vsec)
-            tvd_list.append(tvd)
-            ew_list.append(ew)
-            ns_list.append(ns)
-
-        else:
-            vsec_list.append([unit_util.meter_to_foot(val) for val in vsec])
-            tvd_list.append([unit_util.meter_to_foot(val) for val in tvd])
-            ew_list.append([unit_util.meter_to_foot(val) for val in ew])
-            ns_list.append([unit_util.meter_to_foot(val) for val in ns])
-
-    # Set sources needed by hover
-    for idx in range(len(kpi_names)):
-        dict_hover[kpi_names[idx]] = []
-        for i in range(len(kpi_values)):
-            dict_hover[kpi_names[idx]].append(kpi_values[i][idx])
+        vsec_list.append(vsec)
+        tvd_list.append(tvd)
+        ew_list.append(ew)
+        ns_list.append(ns)
 
-    v_full_data = {**dict(vsec=vsec_list, tvd=tvd_list), **dict_hover}
-    h_full_data = {**dict(ew=ew_list, ns=ns_list), **dict_hover}
+    # Kept in SI, the displayed data is derived from it
+    plot_data_si = dict(vsec=vsec_list, tvd=tvd_list, ew=ew_list, ns=ns_list)
+    v_full_data, h_full_data = get_plot_full_data(plot_data_si, kpi_names, kpi_values, is_metric_unit)
 
     v_source = ColumnDataSource(v_full_data)
     h_source = ColumnDataSource(h_full_data)
@@ -93,6 +117,7 @@ def define_plots(original_traj_data, trajectories, kpi_names, kpi_values, is_met
     plot_v.circle(x="vsec", y="tvd", source=source_md, size=8, color="navy", alpha=0.5,name='p1')
     plot_h.circle(x="ew", y="ns", source=source_md, size=8, color="navy", alpha=0.5,name='p1')
     
+    source_original_data = None
     if original_traj_data:
         md_original, tvd_original, ns_original, ew_original, vsec_original = get_trajectory_list_for_plot(trajectory_dict_list=original_traj_data['Stations']) 
         
@@ -104,17 +129,17 @@ def define_plots(original_traj_data, trajectories, kpi_names, kpi_values, is_met
             origianl_ns_list.append(ns_original)
 
         else:
-            original_vsec_list.append([unit_util.meter_to_foot(val) for val in vsec_original])
-            origianl_tvd_list.append([unit_util.meter_to_foot(val) for val in tvd_original])
-            original_ew_list.append([unit_util.meter_to_foot(val) for val in ew_original])
-            origianl_ns_list.append([unit_util.meter_to_foot(val) for val in ns_original])
+            original_vsec_list.append(unit_util.meter_to_foot(vsec_original))
+            origianl_tvd_list.append(unit_util.meter_to_foot(tvd_original))
+            original_ew_list.append(unit_util.meter_to_foot(ew_original))
+            origianl_ns_list.append(unit_util.meter_to_foot(ns_original))
             
         original_full_data =  {**dict(vsec=original_vsec_list, tvd=origianl_tvd_list, ew=original_ew_list, ns=origianl_ns_list)}
         source_original_data = ColumnDataSource(original_full_data) 
         plot_v.multi_line(xs="vsec", ys="tvd", source=source_original_data,line_width=2,line_color="#FD9F6C")
         plot_h.multi_line(xs="ew", ys="ns", source=source_original_data,line_width=2,line_color="#FD9F6C")
         print('000000')
-    return plot_v, plot_h, v_source, v_full_data, h_source, h_full_data, full_data_md, source_md
+    return plot_v, plot_h, v_source, v_full_data, h_source, h_full_data, full_data_md, source_md, plot_data_si, source_original_data
 
 
 # define SlidingRate-MD Distribution plot
@@ -165,39 +190,33 @@ def TF_MD_distribution_plots(x=[],y=[]):
     
     return plot_md_tf, plot_md_tf_source
 
+def get_table_titles(is_metric_unit):
+    # Change units displayed in titles
+    length_unit = LENGTH_UNIT_DICT[is_metric_unit]
+    return [("comment", "Comment"),
+            ("md", "MD (" + length_unit + ")"),
+            ("incl", "Inclination (deg)"),
+            ("azim", "Azimuth (deg)"),
+            ("tvd", "TVD (" + length_unit + ")"),
+            ("ns", "NS (" + length_unit + ")"),
+            ("ew", "EW (" + length_unit + ")"),
+            ("dls", "DLS (" + DLS_UNIT_DICT[is_metric_unit] + ")")]
+
 def define_table(trajectories, is_metric_unit):
     source = ColumnDataSource(dict())  #
     index_list = np.arange(len(trajectories))
     source.data = get_table_source_data(trajectories, index_list, is_metric_unit)
 
-    # Change units displayed in titles
-    if is_metric_unit:
-        columns = [
-            TableColumn(field="comment", title="Comment"),
-            TableColumn(field="md", title="MD (m)"),
-            TableColumn(field="incl", title="Inclination (deg)"),
-            TableColumn(field="azim", title="Azimuth (deg)"),
-            TableColumn(field="tvd", title="TVD (m)"),
-            TableColumn(field="ns", title="NS (m)"),
-            TableColumn(field="ew", title="EW (m)"),
-            TableColumn(field="dls", title="DLS (deg/30m)")
-        ]
-    else:
-        columns = [
-            TableColumn(field="comment", title="Comment"),
-            TableColumn(field="md", title="MD (ft)"),
-            TableColumn(field="incl", title="Inclination (deg)"),
-            TableColumn(field="azim", title="Azimuth (deg)"),
-            TableColumn(field="tvd", title="TVD (ft)"),
-            TableColumn(field="ns", title="NS (ft)"),
-            TableColumn(field="ew", title="EW (ft)"),
-            TableColumn(field="dls", title="DLS (deg/100ft)")
-        ]
+    columns = [TableColumn(field=field, title=title) for field, title in get_table_titles(is_metric_unit)]
     table = DataTable(source=source, columns=columns, width=1000, height=250)
 
     return table, source
 
 def define_multi_select(kpi_values,trajectories):
+    options = get_select_options(kpi_values, trajectories)
+    return MultiSelect(value=options, options=options, size=25), options
+
+def get_select_options(kpi_values, trajectories):
     options = []
     num = len(trajectories)
     # Considering two cases: whether KpiList exsits
@@ -215,7 +234,7 @@ def define_multi_select(kpi_values,trajectories):
             
             options.append(label)
             
-    return MultiSelect(value=options, options=options, size=25), options
+    return options
 
 def define_range_slider_kpi(kpi_names, kpi_values):
     sliders = []
@@ -252,19 +271,16 @@ def get_kpi_list(trajectories, is_metric_unit):
     return kpi_names, kpi_values
 
 
-def convert_kpi_unit(value_si, name, is_metric_unit):
-    if is_metric_unit:  # Metric unit system
-        if "dls" in name.lower():
-            value = unit_util.radian_per_meter_to_degree_per_thirty_meters(value_si)
-        else:
-            value = value_si  # Assume length measurement
-    else:  # English unit system
-        if "dls" in name.lower():
-            value = unit_util.radian_per_meter_to_degree_per_hundred_feet(value_si)
-        else:
-            value = unit_util.meter_to_foot(value_si)  # Assume length measurement
+def get_kpi_unit(name, is_metric_unit):
+    if "dls" in name.lower():
+        return DLS_UNIT_DICT[is_metric_unit]
+    return LENGTH_UNIT_DICT[is_metric_unit]  # Assume length measurement
 
-    return value
+
+def convert_kpi_unit(value_si, name, is_metric_unit):
+    if is_metric_unit and "dls" not in name.lower():
+        return value_si
+    return unit_util.convert(value_si, "rad/m" if "dls" in name.lower() else "m", get_kpi_unit(name, is_metric_unit))
 
 
 def get_index_list_from_sliders(kpi_values, slider_ranges):
@@ -300,48 +316,27 @@ def get_table_source_data(trajectories, index_list, is_metric_unit):
         table_data = dict()
     else:
         stations = trajectories[index_list[0]]['Stations']
-        comment = []
-        md = []
-        incl = []
-        azim = []
-        tvd = []
-        ns = []
-        ew = []
-        dls = []
-
-        for station in stations:
-            comment.append(station['Comment'])
-            incl.append(round(unit_util.radian_to_degree(station['Inclination']), 2))
-            azim.append(round(unit_util.radian_to_degree(station['Azimuth']), 2))
-            
-            if is_metric_unit:  # Metric unit system
-                md.append(round(station['MD'], 2))
-                tvd.append(round(station['TVD'], 2))
-                ns.append(round(station['NS'], 2))
-                ew.append(round(station['EW'], 2))
-                val = unit_util.radian_per_meter_to_degree_per_thirty_meters(station['DLS'])
-                if val > 1e8:
-                    val = 0
-                dls.append(round(val, 2))
-            else:  # English unit system
-                md.append(round(unit_util.meter_to_foot(station['MD']), 2))
-                tvd.append(round(unit_util.meter_to_foot(station['TVD']), 2))
-                ns.append(round(unit_util.meter_to_foot(station['NS']), 2))
-                ew.append(round(unit_util.meter_to_foot(station['EW']), 2))
-                val = unit_util.radian_per_meter_to_degree_per_hundred_feet(station['DLS'])
-                if val > 1e8:
-                    val = 0
-                dls.append(round(val, 2))
+        # One array per column, converted and rounded in one pass
+        station_array_dict = {key: np.array([station[key] for station in stations], dtype=float)
+                              for key in ('MD', 'TVD', 'NS', 'EW', 'Inclination', 'Azimuth', 'DLS')}
+
+        if is_metric_unit:  # Metric unit system
+            length_dict = {key: station_array_dict[key] for key in ('MD', 'TVD', 'NS', 'EW')}
+            dls = unit_util.radian_per_meter_to_degree_per_thirty_meters(station_array_dict['DLS'])
+        else:  # English unit system
+            length_dict = {key: unit_util.meter_to_foot(station_array_dict[key]) for key in ('MD', 'TVD', 'NS', 'EW')}
+            dls = unit_util.radian_per_meter_to_degree_per_hundred_feet(station_array_dict['DLS'])
+        dls[dls > 1e8] = 0
 
         table_data = dict(
-            comment=comment,
-            md=md,
-            incl=incl,
-            azim=azim,
-            tvd=tvd,
-            ns=ns,
-            ew=ew,
-            dls=dls
+            comment=[station['Comment'] for station in stations],
+            md=np.round(length_dict['MD'], 2).tolist(),
+            incl=np.round(unit_util.radian_to_degree(station_array_dict['Inclination']), 2).tolist(),
+            azim=np.round(unit_util.radian_to_degree(station_array_dict['Azimuth']), 2).tolist(),
+            tvd=np.round(length_dict['TVD'], 2).tolist(),
+            ns=np.round(length_dict['NS'], 2).tolist(),
+            ew=np.round(length_dict['EW'], 2).tolist(),
+            dls=np.round(dls, 2).tolist()
         )
 
     return ColumnDataSource(table_data).data
@@ -383,7 +378,7 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
                         width=250, title='Azimuth', orientation="horizontal", callback_policy='mouseup')
 
     # Define 2D plots
-    plot_v, plot_h, v_source, v_full_data, h_source, h_full_data, full_data_md, source_md = define_plots(original_traj_data,trajectories,kpi_names, kpi_values, is_metric_unit,unit_util.degree_to_radian(slider_azi.value))
+    plot_v, plot_h, v_source, v_full_data, h_source, h_full_data, full_data_md, source_md, plot_data_si, source_original_data = define_plots(original_traj_data,trajectories,kpi_names, kpi_values, is_metric_unit,unit_util.degree_to_radian(slider_azi.value))
         
     plot_md_sr, plot_md_sr_source = SR_MD_distribution_plots() 
     
@@ -404,8 +399,20 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
     # Show information for available candidates
     multi_select.title = "Candidates: " + str(len(full_select_options)) + " available, " + str(len(full_select_options)) + " selected."
 
+    # Data derived once per unit system, and what the table shows
+    kpi_values_dict = {is_metric_unit: kpi_values}
+    full_data_dict = {is_metric_unit: (v_full_data, h_full_data)}
+    full_select_options_dict = {is_metric_unit: full_select_options}
+    table_index_list = np.arange(len(trajectories))
+    is_relabelling = False
+
     def on_multi_select_change(attrname, old, new):
+        nonlocal table_index_list
+        # Only the labels changed, with the unit system
+        if is_relabelling:
+            return
         idx = [int(item.split(")")[0]) for item in new]  
+        table_index_list = idx
     
         # Update displayed information
         multi_select.title = "Candidates: " + str(len(multi_select.options)) + " available, " + str(len(idx)) + " selected."
@@ -480,17 +487,16 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
             
             for index in idx:
                 md, tvd, ns, ew, vsec = get_trajectory_list_for_plot(trajectory_dict_list=trajectories[index]['Stations'],azimuth=azi) #use trajectory
-                if is_metric_unit:
-                    vsec_list.append(vsec)
-                    tvd_list.append(tvd)
-                    ew_list.append(ew)
-                    ns_list.append(ns)
-
-                else:
-                    vsec_list.append([unit_util.meter_to_foot(val) for val in vsec])
-                    tvd_list.append([unit_util.meter_to_foot(val) for val in tvd])
-                    ew_list.append([unit_util.meter_to_foot(val) for val in ew])
-                    ns_list.append([unit_util.meter_to_foot(val) for val in ns])      
+                vsec_list.append(vsec)
+                tvd_list.append(tvd)
+                ew_list.append(ew)
+                ns_list.append(ns)
+            if not is_metric_unit:
+                # All the trajectories in one vectorised pass
+                vsec_list = unit_util.convert_array_list(unit_util.meter_to_foot, vsec_list)
+                tvd_list = unit_util.convert_array_list(unit_util.meter_to_foot, tvd_list)
+                ew_list = unit_util.convert_array_list(unit_util.meter_to_foot, ew_list)
+                ns_list = unit_util.convert_array_list(unit_util.meter_to_foot, ns_list)
 
             v_source.data['vsec'] = vsec_list
             v_source.data['tvd'] = tvd_list
@@ -511,7 +517,9 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
     if kpi_names != [] and kpi_values != []:
         # Update plots, table and multi-section box by selected kpi
         def on_slider_change(attrname, old, new):
+            nonlocal table_index_list
             updated_index_list = get_index_list_from_sliders(kpi_values, [item.value for item in slider_kpi])
+            table_index_list = updated_index_list
 
             table_source.data = get_table_source_data(trajectories, updated_index_list, is_metric_unit)
 
@@ -556,18 +564,18 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
         for trajectory in trajectories:
             md, tvd, ns, ew, vsec = get_trajectory_list_for_plot(trajectory_dict_list=trajectories[0]['Stations'],azimuth=azi) #use trajectory
 
-            if is_metric_unit:
-                vsec_list.append(vsec)
-                tvd_list.append(tvd)
-                ew_list.append(ew)
-                ns_list.append(ns)
-
-            else:
-                vsec_list.append([unit_util.meter_to_foot(val) for val in vsec])
-                tvd_list.append([unit_util.meter_to_foot(val) for val in tvd])
-                ew_list.append([unit_util.meter_to_foot(val) for val in ew])
-                ns_list.append([unit_util.meter_to_foot(val) for val in ns])
+            vsec_list.append(vsec)
+            tvd_list.append(tvd)
+            ew_list.append(ew)
+            ns_list.append(ns)
                     
+        if not is_metric_unit:
+            # All the trajectories in one vectorised pass
+            vsec_list = unit_util.convert_array_list(unit_util.meter_to_foot, vsec_list)
+            tvd_list = unit_util.convert_array_list(unit_util.meter_to_foot, tvd_list)
+            ew_list = unit_util.convert_array_list(unit_util.meter_to_foot, ew_list)
+            ns_list = unit_util.convert_array_list(unit_util.meter_to_foot, ns_list)
+
         v_source.data['vsec'] = vsec_list
         v_source.data['tvd'] = tvd_list
         
@@ -577,6 +585,65 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
             source.data = { value: [cb_obj.value] }
         """) 
     
+    # Change unit system: the sources are rescaled and the widgets relabelled, nothing is rebuilt
+    def set_unit_system(new_is_metric_unit):
+        nonlocal is_metric_unit, kpi_values, v_full_data, h_full_data, full_select_options, is_relabelling
+        if new_is_metric_unit == is_metric_unit:
+            return
+        length_pair = (LENGTH_UNIT_DICT[is_metric_unit], LENGTH_UNIT_DICT[new_is_metric_unit])
+        kpi_pair_dict = {name: (get_kpi_unit(name, is_metric_unit), get_kpi_unit(name, new_is_metric_unit))
+                         for name in kpi_names}
+        is_metric_unit = new_is_metric_unit
+
+        if is_metric_unit not in kpi_values_dict:
+            kpi_values_dict[is_metric_unit] = get_kpi_list(trajectories, is_metric_unit)[1]
+        kpi_values = kpi_values_dict[is_metric_unit]
+        if is_metric_unit not in full_data_dict:
+            full_data_dict[is_metric_unit] = get_plot_full_data(plot_data_si, kpi_names, kpi_values, is_metric_unit)
+        v_full_data, h_full_data = full_data_dict[is_metric_unit]
+        if is_metric_unit not in full_select_options_dict:
+            full_select_options_dict[is_metric_unit] = get_select_options(kpi_values, trajectories)
+        full_select_options = full_select_options_dict[is_metric_unit]
+
+        # Plots
+        set_axis_labels(plot_v, plot_h, is_metric_unit)
+        length_pair_dict = dict(vsec=length_pair, tvd=length_pair, ew=length_pair, ns=length_pair)
+        v_source.data = convert_source_data(v_source.data, {**length_pair_dict, **kpi_pair_dict})
+        h_source.data = convert_source_data(h_source.data, {**length_pair_dict, **kpi_pair_dict})
+        source_md.data = convert_source_data(source_md.data, length_pair_dict)
+        if source_original_data is not None:
+            source_original_data.data = convert_source_data(source_original_data.data, length_pair_dict)
+
+        # Table of the selected trajectory, and md slider over its length
+        for column, (field, title) in zip(table_traj.columns, get_table_titles(is_metric_unit)):
+            column.title = title
+        table_source.data = get_table_source_data(trajectories, table_index_list, is_metric_unit)
+        if table_source.data != {}:
+            total_length = table_source.data['md'][-1]
+            slider_md.end = math.floor(total_length)
+            slider_md.step = total_length/100
+            slider_md.value = min(unit_util.convert(slider_md.value, *length_pair), slider_md.end)
+
+        # Kpi sliders keep the selected ranges
+        if kpi_names != [] and kpi_values != []:
+            tol = 1e-6
+            max_kpis = np.amax(kpi_values, axis=0)
+            min_kpis = np.amin(kpi_values, axis=0)
+            for i, slider in enumerate(slider_kpi):
+                value = unit_util.convert(list(slider.value), *kpi_pair_dict[kpi_names[i]])
+                slider.start = min_kpis[i]
+                slider.end = max_kpis[i] + tol
+                slider.step = (max_kpis[i] - min_kpis[i]) / 100
+                slider.value = (max(value[0], slider.start), min(value[1], slider.end))
+
+        # Candidates keep their selection, with the kpis in their labels
+        is_relabelling = True
+        try:
+            multi_select.options = [full_select_options[int(item.split(")")[0])] for item in multi_select.options]
+            multi_select.value = [full_select_options[int(item.split(")")[0])] for item in multi_select.value]
+        finally:
+            is_relabelling = False
+
     # left column display considering two conditions
     if len(kpi_names) == 0:
         layout_control = column(widgetbox(multi_select),widgetbox(slider_md),widgetbox(slider_azi))
@@ -588,9 +655,12 @@ def refresh_page(trajectories, is_metric_unit, BHA, original_traj_data=[]):
     tab_plots = Tabs(tabs=[tab_2d_plots, tab_3d_plot])
     
     layout_output = column(tab_plots, table_traj,widgetbox(plot_md_sr),widgetbox(plot_md_tf))        
-    return layout_control, layout_output
+    return layout_control, layout_output, set_unit_system
 
 def show_page(doc):
+    # Unit system toggle of the page shown, returned by refresh_page
+    set_unit_system_dict = dict()
+
     # Update trajectory data
     def on_select_file_change(attrname, old, new):
         trajectories = full_data[new]
@@ -600,27 +670,15 @@ def show_page(doc):
         MotorYield = float(radio_group_BHA.labels[num].split()[3].split(':')[1])
         BHA=(BR0,TR0,MotorYield)
         
-        layout_control, layout_output = refresh_page(trajectories, radio_group.active == 0, BHA)
+        layout_control, layout_output, set_unit_system_dict['plan'] = refresh_page(trajectories, radio_group.active == 0, BHA)
         update_layouts(layout_whole, generate_layouts(layout_control, layout_output))
 
     select_file = Select(title='Select data:', value="", options=[], width=250)
     select_file.on_change('value', on_select_file_change)
             
-    # Change unit system
+    # Change unit system, only the displayed data is rescaled
     def on_radio_group_change(attrname, old, new):
-        if len(full_data) == 0:
-            trajectories = []
-        else:
-            trajectories = full_data[select_file.value]
-
-        num = int(radio_group_BHA.active)
-        BR0 = float(radio_group_BHA.labels[num].split()[1].split(':')[1])
-        TR0 = float(radio_group_BHA.labels[num].split()[2].split(':')[1])
-        MotorYield = float(radio_group_BHA.labels[num].split()[3].split(':')[1])
-        BHA=(BR0,TR0,MotorYield)
-        
-        layout_control, layout_output = refresh_page(trajectories, new == 0, BHA)
-        update_layouts(layout_whole, generate_layouts(layout_control, layout_output))
+        set_unit_system_dict['plan'](new == 0)
 
     # Define radio group for unit
     radio_group = RadioGroup(labels=["Metric Unit", "English Unit"], inline=True, active=0)
@@ -639,7 +697,7 @@ def show_page(doc):
         MotorYield = float(radio_group_BHA.labels[num].split()[3].split(':')[1])
         BHA=(BR0,TR0,MotorYield)
         
-        layout_control, layout_output = refresh_page(trajectories, radio_group.active == 0, BHA)
+        layout_control, layout_output, set_unit_system_dict['plan'] = refresh_page(trajectories, radio_group.active == 0, BHA)
         update_layouts(layout_whole, generate_layouts(layout_control, layout_output))
         
             
@@ -722,27 +780,15 @@ def show_page(doc):
         MotorYield = float(radio_group_BHA_1.labels[num].split()[3].split(':')[1])
         BHA=(BR0,TR0,MotorYield)
         
-        layout_control_1, layout_output_1 = refresh_page(trajectories, radio_group_1.active == 0, BHA)
+        layout_control_1, layout_output_1, set_unit_system_dict['ops'] = refresh_page(trajectories, radio_group_1.active == 0, BHA)
         update_layouts(layout_whole_1, generate_layouts_1(layout_control_1, layout_output_1))
 
     select_file_1 = Select(title='Select data:', value="", options=[], width=250)
     select_file_1.on_change('value', on_select_file_1_change)
             
-    # Change unit system
+    # Change unit system, only the displayed data is rescaled
     def on_radio_group_1_change(attrname, old, new):
-        if len(full_data_1) == 0:
-            trajectories = []
-        else:
-            trajectories = full_data_1[select_file_1.value]
-
-        num = int(radio_group_BHA_1.active)
-        BR0 = float(radio_group_BHA_1.labels[num].split()[1].split(':')[1])
-        TR0 = float(radio_group_BHA_1.labels[num].split()[2].split(':')[1])
-        MotorYield = float(radio_group_BHA_1.labels[num].split()[3].split(':')[1])
-        BHA=(BR0,TR0,MotorYield)
-        
-        layout_control_1, layout_output_1 = refresh_page(trajectories, new == 0, BHA)
-        update_layouts(layout_whole_1, generate_layouts_1(layout_control_1, layout_output_1))
+        set_unit_system_dict['ops'](new == 0)
 
     # Define radio group for unit
     radio_group_1 = RadioGroup(labels=["Metric Unit", "English Unit"], inline=True, active=0)
@@ -761,7 +807,7 @@ def show_page(doc):
         MotorYield = float(radio_group_BHA_1.labels[num].split()[3].split(':')[1])
         BHA=(BR0,TR0,MotorYield)
         
-        layout_control_1, layout_output_1 = refresh_page(trajectories, radio_group_1.active == 0, BHA)
+        layout_control_1, layout_output_1, set_unit_system_dict['ops'] = refresh_page(trajectories, radio_group_1.active == 0, BHA)
         update_layouts(layout_whole_1, generate_layouts_1(layout_control_1, layout_output_1))
             
     # Define radio group for BHA
@@ -865,7 +911,7 @@ def show_page(doc):
         MotorYield = float(radio_group_BHA_1.labels[num].split()[3].split(':')[1])
         BHA=(BR0,TR0,MotorYield)
         
-        layout_control_1, layout_output_1 = refresh_page(trajectories, radio_group_1.active == 0, BHA, original_traj_data)
+        layout_control_1, layout_output_1, set_unit_system_dict['ops'] = refresh_page(trajectories, radio_group_1.active == 0, BHA, original_traj_data)
         update_layouts(layout_whole_1, generate_layouts_1(layout_control_1, layout_output_1))
         
         
@@ -940,8 +986,8 @@ def show_page(doc):
         return layout_whole_1
        
     
-    layout_control, layout_output = refresh_page([], radio_group.active == 0, [])
-    layout_control_1, layout_output_1 = refresh_page([], radio_group_1.active == 0, [])
+    layout_control, layout_output, set_unit_system_dict['plan'] = refresh_page([], radio_group.active == 0, [])
+    layout_control_1, layout_output_1, set_unit_system_dict['ops'] = refresh_page([], radio_group_1.active == 0, [])
     
     layout_whole = generate_layouts(layout_control, layout_output)
     layout_whole_1 = generate_layouts_1(layout_control_1, layout_output_1)
@@ -0,0 +1,47 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+# Compare the serial map of scoop.ipynb with ideas1_parallel_map, which needs no python -m scoop:
+# python parallel_map_benchmark.py --size 1000 --workers 4
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "subprosses"))
+from ideas1_parallel_map import ideas1_process_map
+
+
+def slow_abs(value, loop_number=20000):
+    """ abs with some cpu work, to see when the processes pay for their cost. """
+    for _ in range(loop_number):
+        value = -value
+    return abs(value)
+
+
+def time_call(function):
+    start_time = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - start_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time map against ideas1_parallel_map.")
+    parser.add_argument("--size", type=int, default=1000, help="number of items, 1000 in scoop.ipynb")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes of the pool")
+    args = parser.parse_args()
+    data = [random.randint(-1000, 1000) for r in range(args.size)]
+    print("    {0} items, {1} workers on {2} cpus".format(args.size, args.workers, os.cpu_count()))
+    # Started once, as in a program mapping many times
+    process_map, start_time = time_call(lambda: ideas1_process_map(args.workers))
+    list(process_map.map(abs, range(args.workers)))
+    print("    |  Pool start: {:.3f} s".format(start_time))
+    for function in (abs, slow_abs):
+        data_serial, serial_time = time_call(lambda: list(map(function, data)))
+        data_parallel, parallel_time = time_call(lambda: list(process_map.map(function, data)))
+        data_unordered, unordered_time = time_call(lambda: list(process_map.map(function, data, ordered=False)))
+        assert data_serial == data_parallel and sorted(data_serial) == sorted(data_unordered)
+        print("    |  {0}: map {1:.4f} s, parallel ordered {2:.4f} s, unordered {3:.4f} s, speedup {4:.2f}".format(
+            function.__name__, serial_time, parallel_time, unordered_time, serial_time / parallel_time))
+    process_map.close()
@@ -0,0 +1,52 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+# Compare the conversion of trajectories element by element, as atd_view.py did, with one
+# vectorised pass: python unit_conversion_benchmark.py --trajectories 200 --stations 2000
+import argparse
+import time
+import numpy as np
+
+import unit_conversion_utility as unit_util
+
+
+def time_best(function, repeat):
+    best_time = float("inf")
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best_time = min(best_time, time.perf_counter() - start_time)
+    return best_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the scalar and the vectorised unit conversions.")
+    parser.add_argument("--trajectories", type=int, default=200, help="number of trajectories")
+    parser.add_argument("--stations", type=int, default=2000, help="largest number of stations of a trajectory")
+    parser.add_argument("--repeat", type=int, default=5, help="runs kept at best")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    # Lists of floats of different lengths, as returned by get_trajectory_list_for_plot
+    vsec_list = [list(rng.uniform(0, 3000, rng.integers(args.stations // 2, args.stations + 1)))
+                 for _ in range(args.trajectories)]
+    vsec_array_list = [np.array(vsec) for vsec in vsec_list]
+    station_number = sum(len(vsec) for vsec in vsec_list)
+    # Allocated once, out of the timed runs: the trajectories kept in one array and views of it
+    vsec_array = np.concatenate(vsec_array_list)
+    out_array = np.empty_like(vsec_array)
+    out_view_list = np.split(out_array, np.cumsum([len(vsec) for vsec in vsec_list])[:-1])
+
+    scalar_time = time_best(lambda: [[unit_util.meter_to_foot(val) for val in vsec] for vsec in vsec_list], args.repeat)
+    per_list_time = time_best(lambda: [unit_util.meter_to_foot(vsec) for vsec in vsec_list], args.repeat)
+    single_pass_time = time_best(lambda: unit_util.convert_array_list(unit_util.meter_to_foot, vsec_list), args.repeat)
+    registry_time = time_best(lambda: unit_util.convert(np.concatenate(vsec_array_list), "m", "ft"), args.repeat)
+    in_place_time = time_best(lambda: unit_util.meter_to_foot(vsec_array, out=out_array), args.repeat)
+    assert np.allclose(np.concatenate(out_view_list),
+                       np.concatenate([[unit_util.meter_to_foot(val) for val in vsec] for vsec in vsec_list]))
+    print("    {0} trajectories, {1} stations".format(args.trajectories, station_number))
+    for name, duration in (("scalar, element by element", scalar_time),
+                           ("one call per trajectory list", per_list_time),
+                           ("one pass over all trajectories", single_pass_time),
+                           ("one pass into a preallocated out", in_place_time),
+                           ("convert(..., \"m\", \"ft\") on arrays", registry_time)):
+        print("    |  {0:32s} {1:8.2f} ms  x{2:.1f}".format(name, duration * 1000, scalar_time / duration))
@@ -1,98 +1,236 @@
 import math
-
-
-def degree_to_radian(deg):
-    return deg/180.0*math.pi
-
-
-def radian_to_degree(rad):
-    return rad/math.pi*180.0
-
-
-def radian_per_meter_to_degree_per_hundred_feet(val):
-    return radian_to_degree(val) * 0.3048 * 100
-
-
-def degree_per_hundred_feet_to_radian_per_meter(val):
-    return degree_to_radian(val) / 0.3048 / 100
-
-
-def radian_per_meter_to_degree_per_thirty_meters(val):
-    return radian_to_degree(val) * 30.0
-
-
-def degree_per_thirty_meters_to_radian_per_meter(val):
-    return degree_to_radian(val) / 30.0
-
-
-def foot_to_meter(val):
-    return val*0.3048
-
-def meter_to_foot(val):
-    return val/0.3048
-
-def meter_to_inch(val):
-    return val/0.3048*12
-
-def inch_to_meter(val):
-    return val*0.3048/12
-
-def newton_to_klbf(val):
-    return val*0.0002248089
-
-def klbf_to_newton(val):
-    return val/0.0002248089
-
-def newton_meter_to_klbf_foot(val):
-    return val*0.0007375610332
-
-def klbf_foot_to_newton_meter(val):
-    return val/0.0007375610332
-
-def ppg_to_kg_per_liter(val):
-    return val*0.1198264273
-
-def ppg_to_kg_per_cubic_meter(val):
-    return val*119.82642732
-
-def gpm_to_cubic_meter_per_second(val):
-    return val*0.0000630902
-
-def cubic_meter_per_second_to_gpm(val):
-    return val/0.0000630902
-
-def cubic_meter_per_second_to_liter_per_minute(val):
-    return val*60000.0
-
-def gpm_to_liter_per_minute(val):
-    return val*3.785411784
-
-def rpm_to_rad_per_second(val):
-    return val*math.pi/30
-
-def rad_per_second_to_rpm(val):
-    return val/math.pi*30
-
-def foot_per_hour_to_meter_per_second(val):
-    return val*0.0000846667
-
-def foot_per_hour_to_meter_per_hour(val):
-    return val*0.3048
-
-def meter_per_second_to_meter_per_hour(val):
-    return val*3600.0
-
-def meter_per_second_to_foot_per_hour(val):
-    return val*3600.0/0.3048
-
-def psi_to_pa(val):
-    return val*6894.7572932
-
-def pa_to_psi(val):
-    return val/6894.7572932
-
-def pound_to_kilogram(val):
-    return val*0.4535924
-
-def kilogram_to_pound(val):
-    return val/0.4535924
\ No newline at end of file
+import numbers
+import re
+import numpy as np
+
+# Every conversion takes a number, a list or a NumPy array. A number gives a number, anything
+# else a float array converted in one vectorised pass, written to the array out when given.
+#
+# The units are defined once, in the registry below, from the SI base units, and a unit string
+# is a product of units such as "rad/m", "deg/100ft", "klbf*ft" or "kg/m^3": the terms are read
+# from left to right, each one a unit, a number, or a number followed by a unit, with an optional
+# integer power. convert(values, "rad/m", "deg/100ft") resolves the two strings once, and caches
+# the scale and offset of the pair, so a bulk conversion is a single multiply.
+
+BASE_DIMENSION_LIST = ["length", "mass", "time", "angle", "temperature"]
+
+_unit_dict = {}  # symbol -> (scale to SI, offset to SI, dimension)
+_parsed_unit_dict = {}  # unit string -> (scale to SI, offset to SI, dimension)
+_conversion_dict = {}  # (from unit string, to unit string) -> (scale, offset)
+_term_pattern = re.compile(r"(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)?"
+                           r"(?P<symbol>[A-Za-z_%][A-Za-z_0-9]*)?(?:\^(?P<power>[+-]?\d+))?$")
+
+
+_scalar_type_set = frozenset((float, int, np.float64))
+
+
+def _is_scalar(val):
+    # The exact types first: the ABC check alone makes a scalar conversion several times slower
+    return type(val) in _scalar_type_set or isinstance(val, numbers.Number)
+
+
+def _multiply(val, factor, out=None):
+    if out is None and (type(val) in _scalar_type_set or isinstance(val, numbers.Number)):
+        return val*factor
+    return np.multiply(val, factor, out=out, dtype=float)
+
+
+def convert_array_list(convert, val_list, out_list=None):
+    """ Convert arrays of different lengths, such as the trajectories of a plot, in a single pass. """
+    if not val_list:
+        return []
+    result = convert(np.concatenate([np.asarray(val, dtype=float) for val in val_list]))
+    result_list = np.split(result, np.cumsum([len(val) for val in val_list])[:-1])
+    if out_list is None:
+        return result_list
+    for out, result_i in zip(out_list, result_list):
+        out[...] = result_i
+    return out_list
+
+
+def define_base_unit(symbol, dimension_name):
+    """ Define the SI unit of one of the BASE_DIMENSION_LIST. """
+    dimension = tuple(int(name == dimension_name) for name in BASE_DIMENSION_LIST)
+    if not any(dimension):
+        raise ValueError("<?> Unknown dimension {}!".format(dimension_name))
+    _add_unit(symbol, 1.0, 0.0, dimension)
+
+
+def define_unit(symbol, definition, offset=0.0):
+    """ Define a unit from a unit string, e.g. define_unit("ft", "0.3048*m"). The offset, in SI
+        units, is for the scales which do not start at zero: define_unit("degC", "K", 273.15).
+    """
+    scale, _, dimension = parse_unit(definition)
+    _add_unit(symbol, scale, offset, dimension)
+
+
+def _add_unit(symbol, scale, offset, dimension):
+    if not re.fullmatch(r"[A-Za-z_%][A-Za-z_0-9]*", symbol):
+        raise ValueError("<?> {} is not a valid unit symbol!".format(symbol))
+    _unit_dict[symbol] = (scale, offset, dimension)
+    # A new definition may change the strings already resolved
+    _parsed_unit_dict.clear()
+    _conversion_dict.clear()
+
+
+def parse_unit(unit):
+    """ Return (scale to SI, offset to SI, dimension) of a unit string. A unit with an offset, such
+        as degC, only keeps it alone: in a product, as in "W/m/degC", it stands for a difference.
+    """
+    if unit in _parsed_unit_dict:
+        return _parsed_unit_dict[unit]
+    if unit in _unit_dict:
+        _parsed_unit_dict[unit] = _unit_dict[unit]
+        return _unit_dict[unit]
+    scale = 1.0
+    dimension = [0] * len(BASE_DIMENSION_LIST)
+    sign = 1
+    for token in re.split(r"([*/])", unit.replace(" ", "")):
+        if token in ("*", "/"):
+            sign = 1 if token == "*" else -1
+            continue
+        match = _term_pattern.match(token)
+        if not token or match is None:
+            raise ValueError("<?> Cannot read the unit {}!".format(unit))
+        if match.group("number") is not None:
+            scale *= float(match.group("number")) ** sign
+        if match.group("symbol") is not None:
+            if match.group("symbol") not in _unit_dict:
+                raise ValueError("<?> Unknown unit {} in {}!".format(match.group("symbol"), unit))
+            symbol_scale, _, symbol_dimension = _unit_dict[match.group("symbol")]
+            power = sign * int(match.group("power") or 1)
+            scale *= symbol_scale ** power
+            dimension = [exponent + power * symbol_exponent
+                         for exponent, symbol_exponent in zip(dimension, symbol_dimension)]
+        elif match.group("power") is not None:
+            raise ValueError("<?> Cannot read the unit {}!".format(unit))
+    _parsed_unit_dict[unit] = (scale, 0.0, tuple(dimension))
+    return _parsed_unit_dict[unit]
+
+
+def get_conversion(from_unit, to_unit):
+    """ Return (scale, offset) so that a value in to_unit is a value in from_unit * scale + offset. """
+    key = (from_unit, to_unit)
+    if key not in _conversion_dict:
+        from_scale, from_offset, from_dimension = parse_unit(from_unit)
+        to_scale, to_offset, to_dimension = parse_unit(to_unit)
+        if from_dimension != to_dimension:
+            raise ValueError("<?> Cannot convert {} to {}, their dimensions differ!".format(from_unit, to_unit))
+        _conversion_dict[key] = (from_scale / to_scale, (from_offset - to_offset) / to_scale)
+    return _conversion_dict[key]
+
+
+def convert(val, from_unit, to_unit, out=None):
+    """ Convert val, a number, a list or an array, from from_unit to to_unit. """
+    scale, offset = get_conversion(from_unit, to_unit)
+    result = _multiply(val, scale, out)
+    if offset == 0.0:
+        return result
+    if _is_scalar(result):
+        return result + offset
+    return np.add(result, offset, out=result)
+
+
+def conversion_function(from_unit, to_unit):
+    """ Return a function of (val, out=None) converting from_unit to to_unit, with the scale and
+        offset of the pair resolved once, when the function is made.
+    """
+    scale, offset = get_conversion(from_unit, to_unit)
+    if offset == 0.0:
+        def convert_unit(val, out=None):
+            if out is None and type(val) in _scalar_type_set:
+                return val*scale
+            return _multiply(val, scale, out)
+    else:
+        def convert_unit(val, out=None):
+            if out is None and type(val) in _scalar_type_set:
+                return val*scale + offset
+            result = _multiply(val, scale, out)
+            if _is_scalar(result):
+                return result + offset
+            return np.add(result, offset, out=result)
+    return convert_unit
+
+
+define_base_unit("m", "length")
+define_base_unit("kg", "mass")
+define_base_unit("s", "time")
+define_base_unit("rad", "angle")
+define_base_unit("K", "temperature")
+
+# Length
+define_unit("km", "1000*m")
+define_unit("cm", "0.01*m")
+define_unit("mm", "0.001*m")
+define_unit("ft", "0.3048*m")
+define_unit("in", "ft/12")
+define_unit("yd", "3*ft")
+define_unit("mi", "5280*ft")
+# Mass
+define_unit("g", "0.001*kg")
+define_unit("t", "1000*kg")
+define_unit("lb", "0.45359237*kg")
+# Time
+define_unit("min", "60*s")
+define_unit("h", "60*min")
+define_unit("hr", "h")
+define_unit("day", "24*h")
+# Angle
+define_unit("deg", "{!r}*rad".format(math.pi / 180.0))
+define_unit("rev", "{!r}*rad".format(2.0 * math.pi))
+# Temperature
+define_unit("degC", "K", 273.15)
+define_unit("degF", "K/1.8", 273.15 - 32.0 / 1.8)
+define_unit("degR", "K/1.8")
+# Volume and flow rate
+define_unit("L", "0.001*m^3")
+define_unit("gal", "3.785411784*L")
+define_unit("bbl", "42*gal")
+define_unit("gpm", "gal/min")
+define_unit("bpm", "bbl/min")
+# Force and torque
+define_unit("N", "kg*m/s^2")
+define_unit("kN", "1000*N")
+define_unit("lbf", "lb*9.80665*m/s^2")
+define_unit("klbf", "1000*lbf")
+# Pressure and density
+define_unit("Pa", "N/m^2")
+define_unit("kPa", "1000*Pa")
+define_unit("MPa", "1000000*Pa")
+define_unit("bar", "100000*Pa")
+define_unit("psi", "lbf/in^2")
+define_unit("ppg", "lb/gal")
+# Rotation speed
+define_unit("rpm", "rev/min")
+
+
+degree_to_radian = conversion_function("deg", "rad")
+radian_to_degree = conversion_function("rad", "deg")
+radian_per_meter_to_degree_per_hundred_feet = conversion_function("rad/m", "deg/100ft")
+degree_per_hundred_feet_to_radian_per_meter = conversion_function("deg/100ft", "rad/m")
+radian_per_meter_to_degree_per_thirty_meters = conversion_function("rad/m", "deg/30m")
+degree_per_thirty_meters_to_radian_per_meter = conversion_function("deg/30m", "rad/m")
+foot_to_meter = conversion_function("ft", "m")
+meter_to_foot = conversion_function("m", "ft")
+meter_to_inch = conversion_function("m", "in")
+inch_to_meter = conversion_function("in", "m")
+newton_to_klbf = conversion_function("N", "klbf")
+klbf_to_newton = conversion_function("klbf", "N")
+newton_meter_to_klbf_foot = conversion_function("N*m", "klbf*ft")
+klbf_foot_to_newton_meter = conversion_function("klbf*ft", "N*m")
+ppg_to_kg_per_liter = conversion_function("ppg", "kg/L")
+ppg_to_kg_per_cubic_meter = conversion_function("ppg", "kg/m^3")
+gpm_to_cubic_meter_per_second = conversion_function("gpm", "m^3/s")
+cubic_meter_per_second_to_gpm = conversion_function("m^3/s", "gpm")
+cubic_meter_per_second_to_liter_per_minute = conversion_function("m^3/s", "L/min")
+gpm_to_liter_per_minute = conversion_function("gpm", "L/min")
+rpm_to_rad_per_second = conversion_function("rpm", "rad/s")
+rad_per_second_to_rpm = conversion_function("rad/s", "rpm")
+foot_per_hour_to_meter_per_second = conversion_function("ft/h", "m/s")
+foot_per_hour_to_meter_per_hour = conversion_function("ft/h", "m/h")
+meter_per_second_to_meter_per_hour = conversion_function("m/s", "m/h")
+meter_per_second_to_foot_per_hour = conversion_function("m/s", "ft/h")
+psi_to_pa = conversion_function("psi", "Pa")
+pa_to_psi = conversion_function("Pa", "psi")
+pound_to_kilogram = conversion_function("lb", "kg")
+kilogram_to_pound = conversion_function("kg", "lb")
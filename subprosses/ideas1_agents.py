@@ -0,0 +1,320 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import argparse
+import base64
+import hmac
+import json
+import os
+import socket
+import subprocess
+import threading
+from ideas1_utilities import KILL_SIGNAL, ideas1_exit_watcher, ideas1_multiple_processing, signal_process_group, \
+    terminate_process_group
+
+
+def send_message(connection, lock, message):
+    data = (json.dumps(message) + "\n").encode("utf-8")
+    with lock:
+        connection.sendall(data)
+
+
+class ideas1_worker_agent():
+    """ This class runs on every machine of a distributed batch the jobs sent by a coordinator
+        (ideas1_distributed_multiple_processing), and streams their outputs back.
+
+        The messages are JSON lines over TCP:
+        coordinator -> agent: {"type": "hello", "token": ...}
+                              {"type": "run", "job": i, "command": [...], "env": {...} or null}
+                              {"type": "signal", "job": i, "signal": number}
+                              {"type": "kill", "job": i}
+        agent -> coordinator: {"type": "hello", "cpu_provided": n}
+                              {"type": "output", "job": i, "stream": 0 or 1, "data": base64}
+                              {"type": "done", "job": i, "returncode": code}
+
+        The agent runs whatever it is sent: keep it on 127.0.0.1, or give it a token shared
+        with the coordinator before listening on an interface other machines can reach.
+        The coordinator keeps the cpus of the agent from being oversubscribed, and the jobs of a
+        coordinator get SIGTERM, then SIGKILL kill_grace_period seconds later, when its connection
+        is lost.
+    """
+    def __init__(self, cpu_provided, host="127.0.0.1", port=7000, token=None, kill_grace_period=10.0):
+        self.cpu_provided = cpu_provided
+        self.token = token
+        self.kill_grace_period = kill_grace_period
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen()
+        self.port = self.server.getsockname()[1]
+
+    def serve_forever(self):
+        while True:
+            connection, _ = self.server.accept()
+            threading.Thread(target=self.serve_coordinator, args=(connection,), daemon=True).start()
+
+    def serve_coordinator(self, connection):
+        lock = threading.Lock()
+        process_dict = {}
+        try:
+            reader = connection.makefile('rb')
+            hello = json.loads(reader.readline())
+            if self.token is not None and not hmac.compare_digest(str(hello.get("token")), self.token):
+                return
+            send_message(connection, lock, {"type": "hello", "cpu_provided": self.cpu_provided})
+            for line in reader:
+                message = json.loads(line)
+                if message["type"] == "run":
+                    self.run_job(connection, lock, process_dict, message)
+                elif message["type"] == "signal" and message["job"] in process_dict:
+                    signal_process_group(process_dict[message["job"]], message["signal"])
+                elif message["type"] == "kill" and message["job"] in process_dict:
+                    signal_process_group(process_dict[message["job"]], KILL_SIGNAL)
+        except (OSError, ValueError):
+            pass
+        finally:
+            # Nobody waits for the jobs of a lost coordinator anymore
+            for process in list(process_dict.values()):
+                if process.poll() is None:
+                    terminate_process_group(process, self.kill_grace_period)
+            connection.close()
+
+    def run_job(self, connection, lock, process_dict, message):
+        try:
+            process = subprocess.Popen(message["command"],
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE,
+                                       env=message.get("env"),
+                                       start_new_session=True)
+        except OSError as error:
+            send_message(connection, lock, {"type": "output", "job": message["job"], "stream": 1,
+                                            "data": base64.b64encode(str(error).encode("utf-8")).decode("ascii")})
+            send_message(connection, lock, {"type": "done", "job": message["job"], "returncode": 127})
+            return
+        process_dict[message["job"]] = process
+        thread_list = [threading.Thread(target=self.send_output, args=(connection, lock, message["job"], k, pipe),
+                                        daemon=True)
+                       for k, pipe in enumerate((process.stdout, process.stderr))]
+        for thread in thread_list:
+            thread.start()
+        threading.Thread(target=self.send_exit, args=(connection, lock, process_dict, message["job"], thread_list),
+                         daemon=True).start()
+
+    def send_output(self, connection, lock, job, stream, pipe):
+        for chunk in iter(lambda: pipe.read1(65536), b""):
+            try:
+                send_message(connection, lock, {"type": "output", "job": job, "stream": stream,
+                                                "data": base64.b64encode(chunk).decode("ascii")})
+            except OSError:
+                # Keep draining, so the job does not block on a full pipe before it is killed
+                pass
+        pipe.close()
+
+    def send_exit(self, connection, lock, process_dict, job, thread_list):
+        process = process_dict[job]
+        process.wait()
+        for thread in thread_list:
+            thread.join()
+        process_dict.pop(job)
+        try:
+            send_message(connection, lock, {"type": "done", "job": job, "returncode": process.returncode})
+        except OSError:
+            pass
+
+
+class ideas1_remote_process():
+    """ This class stands for a job running on a worker agent, in place of its Popen.
+        With tail_size only the last tail_size bytes of each output are kept in memory,
+        and with stdout_path / stderr_path the full outputs are written to these files.
+    """
+    def __init__(self, agent, job, args, tail_size=None, stdout_path=None, stderr_path=None):
+        self.agent = agent
+        self.job = job
+        self.args = args
+        self.pid = None
+        self.returncode = None
+        self.tail_size = tail_size
+        self.output_list = [bytearray(), bytearray()]
+        self.output_file_list = [open(path, 'wb') if path is not None else None for path in (stdout_path, stderr_path)]
+        self.done_event = threading.Event()
+
+    def write_output(self, stream, data):
+        if self.output_file_list[stream] is not None:
+            self.output_file_list[stream].write(data)
+        output = self.output_list[stream]
+        output += data
+        if self.tail_size is not None and len(output) > self.tail_size:
+            del output[:len(output) - self.tail_size]
+
+    def set_returncode(self, returncode):
+        for output_file in self.output_file_list:
+            if output_file is not None:
+                output_file.close()
+        self.returncode = returncode
+        self.done_event.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        return bytes(self.output_list[0]), bytes(self.output_list[1])
+
+    def send_signal(self, sig):
+        # The runner follows SIGTERM with SIGKILL after its grace period, as for a local job
+        self.agent.send({"type": "signal", "job": self.job, "signal": int(sig)})
+
+    def kill(self):
+        self.agent.send({"type": "kill", "job": self.job})
+
+
+class ideas1_agent_connection():
+    """ This class is the coordinator side of the connection to one worker agent. """
+    def __init__(self, address, token=None):
+        self.address = address
+        self.connection = socket.create_connection(address)
+        self.reader = self.connection.makefile('rb')
+        self.lock = threading.Lock()
+        send_message(self.connection, self.lock, {"type": "hello", "token": token})
+        hello_line = self.reader.readline()
+        if not hello_line:
+            raise ConnectionError("The worker agent {0}:{1} refused the connection".format(*address))
+        self.cpu_provided = json.loads(hello_line)["cpu_provided"]
+        self.cpu_used = 0
+        self.process_dict = {}
+        self.watcher = None
+        self.is_alive = True
+        threading.Thread(target=self.read_messages, daemon=True).start()
+
+    def send(self, message):
+        try:
+            send_message(self.connection, self.lock, message)
+        except OSError:
+            # The reader thread finds out the agent is gone and fails its jobs
+            pass
+
+    def read_messages(self):
+        try:
+            for line in self.reader:
+                message = json.loads(line)
+                if message["type"] == "output":
+                    self.process_dict[message["job"]].write_output(message["stream"], base64.b64decode(message["data"]))
+                elif message["type"] == "done":
+                    self.report_exit(self.process_dict.pop(message["job"]), message["returncode"])
+        except (OSError, ValueError):
+            pass
+        self.is_alive = False
+        for job in list(self.process_dict):
+            process = self.process_dict.pop(job)
+            process.write_output(1, "\n<?> Lost the worker agent {0}:{1}\n".format(*self.address).encode("utf-8"))
+            self.report_exit(process, -1)
+
+    def report_exit(self, process, returncode):
+        process.set_returncode(returncode)
+        self.watcher.exit_queue.put((process, None))
+
+    def close(self):
+        self.connection.close()
+
+
+class ideas1_remote_exit_watcher(ideas1_exit_watcher):
+    """ The agent connections put the exits of the remote jobs into exit_queue themselves. """
+    @staticmethod
+    def is_pidfd_supported():
+        return False
+
+    def register(self, process):
+        pass
+
+
+class ideas1_distributed_multiple_processing(ideas1_multiple_processing):
+    """ This class runs the jobs on the worker agents of several machines instead of this one.
+        cpu_provided is the sum of the cpus the agents provide, and every job is sent to the first
+        agent with enough free cpus. Start an agent on each machine with
+
+        python ideas1_agents.py --port 7000 --cpus 8 --token <secret>
+
+        then run the batch from the coordinator:
+
+        run = ideas1_distributed_multiple_processing([("node1", 7000), ("node2", 7000)],
+                                                     input_job_list, input_cpu_usage_list, token="<secret>")
+        run.run_all_for_executable(log_file_path="batch.log", timeout=3600)
+
+        The commands must be valid on the agents' machines. Core pinning, memory sampling and the
+        journal reattachment only apply to local jobs, and the stragglers are not run twice.
+    """
+    is_speculation_supported = False
+
+    def __init__(self, agent_address_list, input_job_list, input_cpu_usage_list=None, env=None, token=None, **kwargs):
+        self.agent_list = [ideas1_agent_connection(tuple(address), token) for address in agent_address_list]
+        for agent in self.agent_list:
+            print("    The agent {0}:{1} provides {2} cpus".format(agent.address[0], agent.address[1], agent.cpu_provided))
+        super().__init__(sum(agent.cpu_provided for agent in self.agent_list), input_job_list, input_cpu_usage_list,
+                         env, **kwargs)
+
+    def get_job_cpu_usage(self, i):
+        # A job runs on a single agent, it takes at most all the cpus of the largest one
+        return min(self.cpu_usage_list[i], max(agent.cpu_provided for agent in self.agent_list))
+
+    def find_agent(self, i):
+        for agent in self.agent_list:
+            if agent.is_alive and agent.cpu_provided - agent.cpu_used >= self.get_job_cpu_usage(i):
+                return agent
+        return None
+
+    def can_launch_job(self, i):
+        return self.find_agent(i) is not None
+
+    def create_watcher(self):
+        watcher = ideas1_remote_exit_watcher()
+        for agent in self.agent_list:
+            agent.watcher = watcher
+        return watcher
+
+    def launch_job(self, i):
+        agent = self.find_agent(i)
+        self.launched_job_count += 1
+        print("    |  ({0}/{1}) Run job on {2}:{3}: {4}".format(self.launched_job_count, len(self.job_list),
+                                                                 agent.address[0], agent.address[1],
+                                                                 self.input_job_list[i]))
+        process = ideas1_remote_process(agent, i, self.job_list[i],
+                                        self.output_tail_size if self.stream_output else None,
+                                        *self.get_job_log_path_list(i))
+        if self.journal is not None:
+            self.journal.write_running(self.job_list, i, None)
+        agent.cpu_used += self.get_job_cpu_usage(i)
+        agent.process_dict[i] = process
+        agent.send({"type": "run", "job": i, "command": self.job_list[i], "env": self.env})
+        self.add_working_job(i, process)
+
+    def launch_selected_jobs(self):
+        super().launch_selected_jobs()
+        if self.queued_job_index_list and not self.working_job_list and not any(agent.is_alive for agent in self.agent_list):
+            raise ConnectionError("<?> All worker agents are disconnected!")
+
+    def finish_job(self, j, rusage=None):
+        self.working_job_list[j].agent.cpu_used -= self.working_job_cpu_usage_list[j]
+        super().finish_job(j, rusage)
+
+    def close(self):
+        for agent in self.agent_list:
+            agent.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the jobs sent by an ideas1_distributed_multiple_processing coordinator.")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=7000)
+    parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="cpus provided to the coordinator")
+    parser.add_argument("--token", default=None, help="secret the coordinator has to present")
+    parser.add_argument("--kill-grace-period", type=float, default=10.0,
+                        help="seconds between SIGTERM and SIGKILL for the jobs of a lost coordinator")
+    args = parser.parse_args()
+    worker_agent = ideas1_worker_agent(args.cpus, args.host, args.port, args.token, args.kill_grace_period)
+    print("    The worker agent listens on {0}:{1} and provides {2} cpus".format(args.host, worker_agent.port,
+                                                                                 worker_agent.cpu_provided))
+    worker_agent.serve_forever()
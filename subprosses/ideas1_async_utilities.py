@@ -0,0 +1,123 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import asyncio
+import collections
+import time
+from ideas1_utilities import ideas1_multiple_processing, terminate_process_group
+
+
+class ideas1_weighted_semaphore():
+    """ This class is an asyncio semaphore whose acquire() takes a weight instead of one unit.
+        Waiters are admitted in arrival order, so a job asking for many cpus is not starved
+        by the jobs asking for few. A weight larger than the capacity is clipped to it.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.used = 0
+        self.waiter_list = collections.deque()
+
+    async def acquire(self, weight):
+        weight = min(weight, self.capacity)
+        if not self.waiter_list and self.used + weight <= self.capacity:
+            self.used += weight
+            return weight
+        waiter = (weight, asyncio.get_running_loop().create_future())
+        self.waiter_list.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            if waiter[1].cancelled():
+                self.waiter_list.remove(waiter)
+                self.wake_waiters()
+            else:
+                # The weight was granted just before the cancellation
+                self.release(weight)
+            raise
+        return weight
+
+    def release(self, weight):
+        self.used -= weight
+        self.wake_waiters()
+
+    def wake_waiters(self):
+        while self.waiter_list:
+            weight, future = self.waiter_list[0]
+            if future.done():
+                self.waiter_list.popleft()
+                continue
+            if self.used + weight > self.capacity:
+                break
+            self.waiter_list.popleft()
+            self.used += weight
+            future.set_result(True)
+
+
+class ideas1_async_multiple_processing(ideas1_multiple_processing):
+    """ This class is the asyncio counterpart of ideas1_multiple_processing.
+        Jobs are admitted through a weighted semaphore of cpu_provided units, each job taking
+        its entry in cpu_usage_list, so the event loop keeps serving other callbacks while
+        the batch runs. Example inside the tornado IOLoop used by atd_view.py:
+
+        run = ideas1_async_multiple_processing(4, input_job_list, input_cpu_usage_list)
+        IOLoop.current().spawn_callback(run.run_all_for_executable, timeout=100)
+
+        As in ideas1_multiple_processing, every job runs in a session of its own and on timeout
+        its whole process group gets SIGTERM, then SIGKILL kill_grace_period seconds later.
+    """
+    async def run_all_for_executable(self,
+                                     log_file_path=None,
+                                     timeout=None,
+                                     kill_grace_period=10.0):
+        print(time.time())
+        print("    Running the given {0} jobs on given {1} cpus ...".format(len(self.job_list), self.cpu_provided))
+        if log_file_path is not None:
+            my_log_file = open(log_file_path, 'w')
+        else:
+            my_log_file = None
+
+        self.cpu_used = 0
+        semaphore = ideas1_weighted_semaphore(self.cpu_provided)
+        try:
+            # A job failing to start must not close the log file under the jobs still running
+            result_list = await asyncio.gather(*[self.run_job(i, semaphore, my_log_file, timeout, kill_grace_period)
+                                                 for i in range(len(self.job_list))], return_exceptions=True)
+            for i, result in enumerate(result_list):
+                if isinstance(result, BaseException):
+                    print("<?> Job {0} could not be run: {1!r}".format(i + 1, result))
+                    self.write_process_output(self.job_list[i], b"", repr(result).encode("utf-8"), 1, my_log_file)
+                    self.job_returncode_dict[i] = 1
+        finally:
+            if my_log_file is not None:
+                my_log_file.close()
+
+        print("    All {0} jobs have been run on given {1} cpus...".format(len(self.job_list), self.cpu_provided))
+        print(time.time())
+
+    async def run_job(self, i, semaphore, log_file, timeout, kill_grace_period=10.0):
+        weight = await semaphore.acquire(self.cpu_usage_list[i])
+        self.cpu_used += weight
+        try:
+            print("    |  ({0}/{1}) Run job: {2}".format(i+1, len(self.job_list), self.input_job_list[i]))
+            process = await asyncio.create_subprocess_exec(*self.job_list[i],
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.PIPE,
+                                                           env=self.env,
+                                                           start_new_session=True)
+            self.working_job_list.append(process)
+            # Reading the pipes while waiting keeps chatty jobs from blocking on a full pipe
+            communicate_task = asyncio.ensure_future(process.communicate())
+            done, _ = await asyncio.wait({communicate_task}, timeout=timeout)
+            kill_timer = None
+            if not done:
+                # The processes the job started hold the pipes as well, take them all down
+                kill_timer = terminate_process_group(process, kill_grace_period)
+            outs, errs = await communicate_task
+            if kill_timer is not None:
+                kill_timer.cancel()
+            self.working_job_list.remove(process)
+            self.write_process_output(self.job_list[i], outs, errs, process.returncode, log_file, is_timeout=not done)
+            self.job_returncode_dict[i] = process.returncode
+        finally:
+            self.cpu_used -= weight
+            semaphore.release(weight)
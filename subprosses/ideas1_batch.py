@@ -0,0 +1,80 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import base64
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from ideas1_utilities import terminate_process_group
+from ideas1_worker import read_tail
+
+
+def run_batch(batch_dict, result_path):
+    """ Run the jobs of a batch one after the other and append one result line per job to
+        result_path as soon as it is done, so the results of a killed batch are kept.
+        A job reaching its timeout, or working when the batch gets SIGTERM, gets SIGTERM then
+        SIGKILL after the grace period of the runner.
+    """
+    # Reused by the jobs without job log files
+    temp_file_list = [tempfile.TemporaryFile(), tempfile.TemporaryFile()]
+    process = None
+    kill_grace_period = batch_dict.get("kill_grace_period", 10.0)
+    terminated_list = []
+
+    def terminate(signal_number, frame):
+        # Timeout of the whole batch: the job runs in its own group, take it down as well, then
+        # exit once its result is written
+        terminated_list.append(signal_number)
+        if process is not None and process.returncode is None:
+            terminate_process_group(process, kill_grace_period)
+    signal.signal(signal.SIGTERM, terminate)
+    with open(result_path, 'w') as result_file:
+        for job in batch_dict["job_list"]:
+            if terminated_list:
+                break
+            output_file_list = [open(path, 'w+b') if path is not None else temp_file
+                                for path, temp_file in zip((job["stdout_path"], job["stderr_path"]), temp_file_list)]
+            for temp_file in temp_file_list:
+                temp_file.seek(0)
+                temp_file.truncate()
+            start_time = time.time()
+            timeout_list = []
+            try:
+                process = subprocess.Popen(job["command"], stdout=output_file_list[0], stderr=output_file_list[1],
+                                           start_new_session=True)
+            except OSError as error:
+                output_file_list[1].write(str(error).encode("utf-8"))
+                returncode = 127
+            else:
+                # A timer rather than wait(timeout), which polls
+                timer = None
+                if batch_dict["timeout"] is not None:
+                    timer = threading.Timer(batch_dict["timeout"],
+                                            lambda: timeout_list.append(terminate_process_group(process, kill_grace_period)))
+                    timer.start()
+                returncode = process.wait()
+                if timer is not None:
+                    timer.cancel()
+            wall_time = time.time() - start_time
+            output_list = [read_tail(output_file, batch_dict["tail_size"]) for output_file in output_file_list]
+            for output_file in output_file_list:
+                if output_file not in temp_file_list:
+                    output_file.close()
+            result_file.write(json.dumps({"job": job["job"], "returncode": returncode, "wall_time": wall_time,
+                                          "is_timeout": bool(timeout_list or terminated_list),
+                                          "outputs": [base64.b64encode(output).decode("ascii")
+                                                      for output in output_list]}) + "\n")
+            result_file.flush()
+    if terminated_list:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.kill(os.getpid(), signal.SIGTERM)
+
+
+if __name__ == "__main__":
+    # Started by ideas1_multiple_processing.launch_batch, with the batch as JSON on stdin
+    run_batch(json.load(sys.stdin), sys.argv[1])
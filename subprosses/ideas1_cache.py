@@ -0,0 +1,128 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import collections
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+
+class ideas1_result_cache():
+    """ This class keeps the outputs of finished jobs on disk, addressed by a hash of everything
+        deciding them: the argv, the working directory, the values of env_key_list in the job
+        environment and the contents of the declared input files.
+
+        Only the jobs exiting with 0 are stored. Every entry is a directory holding stdout, stderr
+        and meta.json, whose modification time is refreshed on each hit. Once the cache is larger
+        than max_size bytes the least recently used entries are removed.
+
+        The sizes of the entries are read from the directory once, on the first store, then kept
+        in memory in the order of their last use, so a store only removes the entries it has to.
+        The entries stored meanwhile by other runners are counted by the next cache object.
+    """
+    def __init__(self, cache_dir, max_size=1024**3, env_key_list=None):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.env_key_list = env_key_list if env_key_list is not None else []
+        # Entry directory -> size in bytes, the least recently used first, None until scanned
+        self.entry_size_dict = None
+        self.total_size = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def get_file_digest(path):
+        if not os.path.isfile(path):
+            return None
+        digest = hashlib.sha256()
+        with open(path, 'rb') as input_file:
+            for chunk in iter(lambda: input_file.read(1024*1024), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def get_job_key(self, command_list, env=None, input_path_list=None):
+        if env is None:
+            env = os.environ
+        key_dict = {"args": list(command_list),
+                    "cwd": os.getcwd(),
+                    "env": [[name, env.get(name)] for name in self.env_key_list],
+                    "inputs": [[path, self.get_file_digest(path)] for path in (input_path_list or [])]}
+        return hashlib.sha256(json.dumps(key_dict, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def load(self, key):
+        """ Return the meta dict of the entry, with the paths of its stdout and stderr, None on a miss. """
+        entry_dir = self.get_entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, "meta.json")) as meta_file:
+                meta_dict = json.load(meta_file)
+            os.utime(os.path.join(entry_dir, "meta.json"))
+        except (OSError, ValueError):
+            return None
+        if self.entry_size_dict is not None and entry_dir in self.entry_size_dict:
+            self.entry_size_dict.move_to_end(entry_dir)
+        meta_dict["stdout_path"] = os.path.join(entry_dir, "stdout")
+        meta_dict["stderr_path"] = os.path.join(entry_dir, "stderr")
+        return meta_dict
+
+    def store(self, key, command_list, returncode, outs=b"", errs=b"", stdout_path=None, stderr_path=None):
+        """ Store the outputs given as bytes, or copied from stdout_path and stderr_path. """
+        if returncode != 0 or os.path.isdir(self.get_entry_dir(key)):
+            return
+        os.makedirs(os.path.dirname(self.get_entry_dir(key)), exist_ok=True)
+        # Fill a temporary directory then rename it, so a reader never sees half an entry
+        temp_dir = tempfile.mkdtemp(dir=os.path.dirname(self.get_entry_dir(key)))
+        for name, output, path in (("stdout", outs, stdout_path), ("stderr", errs, stderr_path)):
+            if path is not None:
+                shutil.copyfile(path, os.path.join(temp_dir, name))
+            else:
+                with open(os.path.join(temp_dir, name), 'wb') as output_file:
+                    output_file.write(output)
+        with open(os.path.join(temp_dir, "meta.json"), 'w') as meta_file:
+            json.dump({"args": list(command_list), "returncode": returncode, "time": time.time()}, meta_file)
+        size = self.get_entry_size(temp_dir)
+        if self.entry_size_dict is None:
+            self.scan_entries()
+        try:
+            os.rename(temp_dir, self.get_entry_dir(key))
+        except OSError:
+            # Stored meanwhile by another runner
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            return
+        self.entry_size_dict[self.get_entry_dir(key)] = size
+        self.total_size += size
+        self.evict()
+
+    @staticmethod
+    def get_entry_size(entry_dir):
+        return sum(os.path.getsize(os.path.join(entry_dir, name)) for name in os.listdir(entry_dir))
+
+    def scan_entries(self):
+        """ Read the sizes and last use times of the entries on disk. """
+        entry_list = []
+        for prefix in os.listdir(self.cache_dir):
+            prefix_dir = os.path.join(self.cache_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            for key in os.listdir(prefix_dir):
+                entry_dir = os.path.join(prefix_dir, key)
+                try:
+                    size = self.get_entry_size(entry_dir)
+                    used_time = os.path.getmtime(os.path.join(entry_dir, "meta.json"))
+                except OSError:
+                    # A temporary directory, or an entry being removed
+                    continue
+                entry_list.append((used_time, size, entry_dir))
+        self.entry_size_dict = collections.OrderedDict((entry_dir, size) for _, size, entry_dir in sorted(entry_list))
+        self.total_size = sum(self.entry_size_dict.values())
+
+    def evict(self):
+        """ Remove the least recently used entries until the cache fits in max_size bytes. """
+        while self.total_size > self.max_size and self.entry_size_dict:
+            entry_dir, size = self.entry_size_dict.popitem(last=False)
+            shutil.rmtree(entry_dir, ignore_errors=True)
+            self.total_size -= size
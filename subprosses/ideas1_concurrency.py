@@ -0,0 +1,89 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import os
+import time
+from ideas1_proc import read_cpu_time, read_loadavg
+
+
+class ideas1_adaptive_cpu_budget():
+    """ This class moves the cpu budget of a runner between cpu_floor and cpu_ceiling from the
+        load of the whole machine, read every sample_interval seconds:
+
+        idle cpus    the share of idle (or io waiting) time in /proc/stat since the last sample,
+                     times the cpus of the machine
+        load         the 1 minute load average of /proc/loadavg
+
+        The budget grows by step while jobs are queued and at least step - idle_margin cpus are
+        idle, so io bound jobs get more company. It shrinks by step when fewer than idle_margin
+        cpus are idle and the load is above the cpus of the machine, as other workloads compete
+        with the jobs. A change only happens after the same reading on confirm_number samples in
+        a row, which with the dead band between both rules keeps the budget from oscillating.
+        Running jobs are never stopped: a smaller budget only holds back the next launches.
+
+        Without /proc the budget stays at cpu_ceiling.
+    """
+    def __init__(self, cpu_floor, cpu_ceiling, sample_interval=2.0, step=1, idle_margin=0.25, confirm_number=2):
+        if not 0 < cpu_floor <= cpu_ceiling:
+            raise ValueError("The cpu floor {0} should be above 0 and at most the ceiling {1}".format(cpu_floor, cpu_ceiling))
+        self.cpu_floor = cpu_floor
+        self.cpu_ceiling = cpu_ceiling
+        self.sample_interval = sample_interval
+        self.step = step
+        self.idle_margin = idle_margin
+        self.confirm_number = confirm_number
+        self.cpu_number = os.cpu_count() or 1
+        self.cpu_budget = cpu_ceiling
+        self.cpu_time = None
+        self.next_sample_time = None
+        self.direction = 0
+        self.direction_count = 0
+        self.budget_list = []
+
+    def start(self):
+        """ Return the first budget: the cpus idle now, within the floor and the ceiling. """
+        self.cpu_time = read_cpu_time()
+        loadavg_list = read_loadavg()
+        if self.cpu_time is None or loadavg_list is None:
+            self.cpu_budget = self.cpu_ceiling
+        else:
+            self.cpu_budget = min(max(int(self.cpu_number - loadavg_list[0]), self.cpu_floor), self.cpu_ceiling)
+        self.direction = 0
+        self.direction_count = 0
+        self.budget_list = [(time.time(), self.cpu_budget)]
+        self.next_sample_time = time.time() + self.sample_interval
+        return self.cpu_budget
+
+    def update(self, is_job_queued):
+        """ Read the load of the machine and return the new budget. """
+        self.next_sample_time = time.time() + self.sample_interval
+        cpu_time = read_cpu_time()
+        loadavg_list = read_loadavg()
+        if cpu_time is None or loadavg_list is None or self.cpu_time is None:
+            return self.cpu_budget
+        total_tick = cpu_time[1] - self.cpu_time[1]
+        idle_cpu = self.cpu_number * (cpu_time[0] - self.cpu_time[0]) / total_tick if total_tick > 0 else 0.0
+        self.cpu_time = cpu_time
+        direction = 0
+        if is_job_queued and idle_cpu >= self.step - self.idle_margin and self.cpu_budget < self.cpu_ceiling:
+            direction = 1
+        elif idle_cpu < self.idle_margin and loadavg_list[0] > self.cpu_number and self.cpu_budget > self.cpu_floor:
+            direction = -1
+        if direction != self.direction:
+            self.direction = direction
+            self.direction_count = 0
+        self.direction_count += 1
+        if direction == 0 or self.direction_count < self.confirm_number:
+            return self.cpu_budget
+        self.direction_count = 0
+        self.cpu_budget = min(max(self.cpu_budget + direction * self.step, self.cpu_floor), self.cpu_ceiling)
+        self.budget_list.append((time.time(), self.cpu_budget))
+        print("    |  The cpu budget is now {0} ({1:.1f} cpus idle, load {2:.2f})".format(
+            self.cpu_budget, idle_cpu, loadavg_list[0]))
+        return self.cpu_budget
+
+    def finish(self):
+        budget_list = [cpu_budget for _, cpu_budget in self.budget_list]
+        if len(budget_list) > 1:
+            print("    The cpu budget went from {0} to {1}, between {2} and {3}".format(
+                budget_list[0], budget_list[-1], min(budget_list), max(budget_list)))
@@ -0,0 +1,72 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import re
+import sqlite3
+import statistics
+import time
+
+
+class ideas1_runtime_history():
+    """ This class stores every finished job of ideas1_multiple_processing in a SQLite file
+        and predicts the runtime of new jobs from it.
+
+        A prediction is the median wall time of the last successful runs of the same command.
+        If the command never ran, the runs sharing its signature are used instead: the command
+        with numbers and file paths masked, so "eclrun visage --np=3 D:/case_2/CASE.MII" learns
+        from the runs of "eclrun visage --np=3 D:/case_1/CASE.MII".
+    """
+    number_pattern = re.compile(r"^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$")
+
+    def __init__(self, db_path, sample_size=20):
+        self.db_path = db_path
+        self.sample_size = sample_size
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS job_history ("
+                                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                "command TEXT, "
+                                "signature TEXT, "
+                                "cpu_usage REAL, "
+                                "wall_time REAL, "
+                                "returncode INTEGER, "
+                                "peak_memory_kb INTEGER, "
+                                "finish_time REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS job_history_command ON job_history (command)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS job_history_signature ON job_history (signature)")
+        self.connection.commit()
+
+    @classmethod
+    def get_command_signature(cls, command_list):
+        signature_list = []
+        for token in command_list:
+            if cls.number_pattern.match(token):
+                signature_list.append("<number>")
+            elif "/" in token or "\\" in token:
+                signature_list.append("<path>")
+            else:
+                signature_list.append(token)
+        return " ".join(signature_list)
+
+    def record(self, command_list, cpu_usage, wall_time, returncode, peak_memory_kb=None):
+        self.connection.execute("INSERT INTO job_history (command, signature, cpu_usage, wall_time, returncode, "
+                                "peak_memory_kb, finish_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (" ".join(command_list), self.get_command_signature(command_list), cpu_usage,
+                                 wall_time, returncode, peak_memory_kb, time.time()))
+        self.connection.commit()
+
+    def get_recent_wall_time_list(self, column, value):
+        cursor = self.connection.execute("SELECT wall_time FROM job_history WHERE {} = ? AND returncode = 0 "
+                                         "ORDER BY id DESC LIMIT ?".format(column), (value, self.sample_size))
+        return [row[0] for row in cursor]
+
+    def predict_runtime(self, command_list):
+        """ Return the predicted wall time in seconds, or None without matching history. """
+        wall_time_list = self.get_recent_wall_time_list("command", " ".join(command_list))
+        if not wall_time_list:
+            wall_time_list = self.get_recent_wall_time_list("signature", self.get_command_signature(command_list))
+        if not wall_time_list:
+            return None
+        return statistics.median(wall_time_list)
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,50 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+HEAVY_MODULE_LIST = ["numpy", "matplotlib"]
+
+
+def time_interpreter(code, repeat):
+    """ Return the median wall time of repeat fresh interpreters running code. """
+    duration_list = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        duration_list.append(time.perf_counter() - start_time)
+    return statistics.median(duration_list)
+
+
+def run_benchmark(module_name="ideas1_run", repeat=10, budget=0.15):
+    """ Time the import of module_name in a fresh interpreter, less the start of a bare one, and
+        return 0 when it stays within budget seconds without loading any of HEAVY_MODULE_LIST.
+    """
+    bare_time = time_interpreter("pass", repeat)
+    import_time = time_interpreter("import {}".format(module_name), repeat) - bare_time
+    loaded_module_list = subprocess.run(
+        [sys.executable, "-c", "import sys, {0}; print(' '.join(m for m in {1} if m in sys.modules))".format(
+            module_name, HEAVY_MODULE_LIST)],
+        check=True, stdout=subprocess.PIPE, universal_newlines=True,
+        cwd=os.path.dirname(os.path.abspath(__file__))).stdout.split()
+    print("    Importing {0} takes {1:.3f} s over the {2:.3f} s of a bare interpreter (budget {3:.3f} s)".format(
+        module_name, import_time, bare_time, budget))
+    if loaded_module_list:
+        print("<?> Importing {0} loads {1}!".format(module_name, ", ".join(loaded_module_list)))
+    if import_time > budget:
+        print("<?> Importing {0} is over budget!".format(module_name))
+    return 1 if loaded_module_list or import_time > budget else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the start time of the job runner.")
+    parser.add_argument("--module", default="ideas1_run", help="module to import")
+    parser.add_argument("--repeat", type=int, default=10, help="interpreters started per measure")
+    parser.add_argument("--budget", type=float, default=0.15, help="largest import time allowed in seconds")
+    args = parser.parse_args()
+    sys.exit(run_benchmark(args.module, args.repeat, args.budget))
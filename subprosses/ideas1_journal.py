@@ -0,0 +1,154 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import json
+import os
+import signal
+import time
+from ideas1_proc import read_process_start_time
+
+
+class ideas1_job_journal():
+    """ This class is a write-ahead journal of the job states of a batch.
+
+        Every transition (queued, running, finished, failed) is appended as one JSON line and
+        flushed to disk before the runner goes on, so a runner restarted on the same journal
+        knows which jobs are done. A record only applies to the job at the same index with the
+        same command, so changing the job list makes the old records ignored.
+
+        A running job writes its returncode to a status file in the <journal_path>.status
+        directory once it exits (see ideas1_status), named in its running record, so a restarted
+        runner knows how the jobs it did not start have ended.
+    """
+    def __init__(self, journal_path, sync=True):
+        self.journal_path = journal_path
+        self.sync = sync
+        self.journal_file = None
+        self.status_dir = journal_path + ".status"
+
+    def load(self, job_list):
+        """ Return the last record of every job of job_list found in the journal. """
+        state_dict = {}
+        if not os.path.isfile(self.journal_path):
+            return state_dict
+        with open(self.journal_path) as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # The last line may be cut if the runner died while writing it
+                    continue
+                i = record["job"]
+                if i < len(job_list) and record["command"] == job_list[i]:
+                    state_dict[i] = record
+        return state_dict
+
+    def write(self, record_list):
+        if self.journal_file is None:
+            self.journal_file = open(self.journal_path, 'a')
+        for record in record_list:
+            record["time"] = time.time()
+            self.journal_file.write(json.dumps(record) + "\n")
+        self.journal_file.flush()
+        if self.sync:
+            os.fsync(self.journal_file.fileno())
+
+    def write_queued(self, job_list, index_list):
+        self.write([{"job": i, "command": job_list[i], "state": "queued"} for i in index_list])
+
+    def write_running(self, job_list, i, pid, status_path=None):
+        self.write([{"job": i, "command": job_list[i], "state": "running", "pid": pid,
+                     "start_time": read_process_start_time(pid), "status_path": status_path}])
+
+    def write_done(self, job_list, i, returncode):
+        state = "finished" if returncode == 0 else "failed"
+        self.write([{"job": i, "command": job_list[i], "state": state, "returncode": returncode}])
+        # Only needed while the job is running
+        try:
+            os.remove(self.get_status_path(i))
+        except FileNotFoundError:
+            pass
+
+    def get_status_path(self, i):
+        return os.path.join(self.status_dir, "job_{}.status".format(i + 1))
+
+    def prepare_status_path(self, i):
+        """ Return the status file of job i, without the status left by an earlier run of it. """
+        os.makedirs(self.status_dir, exist_ok=True)
+        status_path = self.get_status_path(i)
+        try:
+            os.remove(status_path)
+        except FileNotFoundError:
+            pass
+        return status_path
+
+    @staticmethod
+    def read_status(status_path):
+        """ Return the returncode written to status_path, None if the job has not written it. """
+        if status_path is None:
+            return None
+        try:
+            with open(status_path) as status_file:
+                return int(status_file.read())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def is_record_process_alive(record):
+        """ Whether the process of a running record is still the same process, checked with its start time. """
+        if record.get("start_time") is None:
+            return False
+        return read_process_start_time(record["pid"]) == record["start_time"]
+
+    def close(self):
+        if self.journal_file is not None:
+            self.journal_file.close()
+            self.journal_file = None
+
+
+class ideas1_reattached_process():
+    """ This class stands for a job left running by a runner that died, in place of its Popen.
+        It is not a child of this process, so its outputs are lost and its returncode is read
+        from its status file once it is gone. Without one the returncode is UNKNOWN_RETURNCODE,
+        and the runner runs the job again rather than counting it as finished.
+    """
+    # Not 0, so a job whose exit status is unknown never counts as a success
+    UNKNOWN_RETURNCODE = -1
+
+    def __init__(self, pid, args, status_path=None):
+        self.pid = pid
+        self.args = args
+        self.status_path = status_path
+        self.returncode = None
+        self.is_exit_status_known = False
+        self.start_time = read_process_start_time(pid)
+
+    def poll(self):
+        if self.returncode is None and read_process_start_time(self.pid) != self.start_time:
+            # The exit status of a process that is not a child cannot be waited for
+            self.returncode = ideas1_job_journal.read_status(self.status_path)
+            self.is_exit_status_known = self.returncode is not None
+            if self.returncode is None:
+                self.returncode = self.UNKNOWN_RETURNCODE
+        return self.returncode
+
+    def wait(self, timeout=None):
+        end_time = None if timeout is None else time.time() + timeout
+        while self.poll() is None:
+            if end_time is not None and time.time() > end_time:
+                return None
+            time.sleep(0.5)
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        return b"", b""
+
+    def send_signal(self, sig):
+        try:
+            os.kill(self.pid, sig)
+        except ProcessLookupError:
+            pass
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
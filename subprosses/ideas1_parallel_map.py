@@ -0,0 +1,114 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import concurrent.futures
+import itertools
+import math
+import os
+import time
+
+
+def run_chunk(function, item_list):
+    """ Apply function to the items of a chunk in a pool process, and time it. """
+    start_time = time.perf_counter()
+    result_list = [function(item) for item in item_list]
+    return result_list, time.perf_counter() - start_time
+
+
+class ideas1_process_map():
+    """ This class maps a function over an iterable with a pool of worker_number processes, in
+        place of scoop.futures.map, which needs the program to be started with python -m scoop:
+
+        process_map = ideas1_process_map(4)
+        result = list(process_map.map(abs, data))
+        process_map.close()
+
+        The iterable is read lazily, chunk by chunk, and at most max_chunk_number chunks (by
+        default 2 per worker) are in the pool at the same time, so an endless generator can be
+        mapped with bounded memory. The results are yielded as soon as they are there: in the
+        order of the items, or with ordered=False in the order the chunks finish.
+
+        Unless chunk_size is given, the first chunks hold one item each. The chunk size then
+        follows the measured time per item, for chunks of about target_chunk_time seconds which
+        make the cost of sending them small, and never more than a quarter of the items per worker
+        when the iterable has a length. The function and the items must be picklable (no lambda).
+    """
+    def __init__(self, worker_number=None, max_chunk_number=None, target_chunk_time=0.05, max_chunk_size=65536):
+        self.worker_number = worker_number if worker_number is not None else os.cpu_count() or 1
+        self.max_chunk_number = max_chunk_number if max_chunk_number is not None else 2 * self.worker_number
+        self.target_chunk_time = target_chunk_time
+        self.max_chunk_size = max_chunk_size
+        self.executor = concurrent.futures.ProcessPoolExecutor(self.worker_number)
+
+    def get_chunk_size(self, item_time, item_number):
+        """ Return the size of the next chunk from the measured time per item, 1 before any is measured. """
+        if item_time is None:
+            chunk_size = 1
+        elif item_time <= 0:
+            chunk_size = self.max_chunk_size
+        else:
+            chunk_size = int(self.target_chunk_time / item_time)
+        if item_number is not None:
+            chunk_size = min(chunk_size, math.ceil(item_number / (4 * self.worker_number)))
+        return min(max(chunk_size, 1), self.max_chunk_size)
+
+    def map(self, function, iterable, ordered=True, chunk_size=None):
+        item_number = len(iterable) if hasattr(iterable, "__len__") else None
+        item_iterator = iter(iterable)
+        # Running average of the time per item, over the chunks done so far
+        item_time = None
+        done_time = 0.0
+        done_item_number = 0
+        future_dict = {}
+        ready_dict = {}
+        next_chunk_index = 0
+        next_yield_index = 0
+        is_exhausted = False
+        try:
+            while True:
+                while not is_exhausted and len(future_dict) + len(ready_dict) < self.max_chunk_number:
+                    size = chunk_size if chunk_size is not None else self.get_chunk_size(item_time, item_number)
+                    item_list = list(itertools.islice(item_iterator, size))
+                    if not item_list:
+                        is_exhausted = True
+                        break
+                    future_dict[self.executor.submit(run_chunk, function, item_list)] = next_chunk_index
+                    next_chunk_index += 1
+                if not future_dict and not ready_dict:
+                    return
+                if future_dict:
+                    done_future_set, _ = concurrent.futures.wait(future_dict,
+                                                                 return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done_future_set:
+                        result_list, chunk_time = future.result()
+                        done_time += chunk_time
+                        done_item_number += len(result_list)
+                        item_time = done_time / done_item_number
+                        ready_dict[future_dict.pop(future)] = result_list
+                if ordered:
+                    # A chunk finished early waits for the ones before it, and counts as in flight meanwhile
+                    while next_yield_index in ready_dict:
+                        yield from ready_dict.pop(next_yield_index)
+                        next_yield_index += 1
+                else:
+                    for result_list in list(ready_dict.values()):
+                        yield from result_list
+                    ready_dict.clear()
+        finally:
+            # When the caller stops early, the chunks not started yet are dropped
+            for future in future_dict:
+                future.cancel()
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def parallel_map(function, iterable, worker_number=None, ordered=True, chunk_size=None, **kwargs):
+    """ Yield function(item) for the items of iterable, computed in a pool of processes started
+        for this map only, see ideas1_process_map.
+    """
+    process_map = ideas1_process_map(worker_number, **kwargs)
+    try:
+        yield from process_map.map(function, iterable, ordered, chunk_size)
+    finally:
+        process_map.close()
@@ -0,0 +1,92 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import math
+import os
+import re
+
+
+def parse_cpu_list(cpu_list_text):
+    """ Parse a kernel cpu list such as "0-3,8-11" into a list of core ids. """
+    core_list = []
+    for part in cpu_list_text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            core_list.extend(range(int(first), int(last) + 1))
+        else:
+            core_list.append(int(part))
+    return core_list
+
+
+def read_numa_node_list(node_dir="/sys/devices/system/node"):
+    """ Return the core ids of every NUMA node, an empty list when the layout is not available. """
+    if not os.path.isdir(node_dir):
+        return []
+    node_list = []
+    for name in sorted(os.listdir(node_dir), key=lambda name: (len(name), name)):
+        if not re.match(r"^node\d+$", name):
+            continue
+        with open(os.path.join(node_dir, name, "cpulist")) as cpu_list_file:
+            core_list = parse_cpu_list(cpu_list_file.read())
+        if core_list:
+            node_list.append(core_list)
+    return node_list
+
+
+class ideas1_core_placement():
+    """ This class hands out disjoint sets of cores to the jobs and takes them back when they exit.
+
+        Only the cores this process may run on are used, grouped by NUMA node. A job gets its cores
+        from the node with the fewest free cores that can still hold it, keeping the large free
+        blocks for the large jobs. A job larger than every free block is spread over the nodes
+        with the most free cores.
+    """
+    def __init__(self, node_dir="/sys/devices/system/node"):
+        allowed_core_set = set(os.sched_getaffinity(0))
+        self.free_node_list = []
+        for core_list in read_numa_node_list(node_dir):
+            core_set = allowed_core_set.intersection(core_list)
+            if core_set:
+                self.free_node_list.append(core_set)
+                allowed_core_set -= core_set
+        if allowed_core_set:
+            # Cores missing from the node layout, or no layout at all
+            self.free_node_list.append(allowed_core_set)
+        self.node_core_list = [frozenset(core_set) for core_set in self.free_node_list]
+
+    def get_free_core_number(self):
+        return sum(len(core_set) for core_set in self.free_node_list)
+
+    def allocate(self, cpu_number):
+        """ Return the cores given to a job using cpu_number cpus, None if not enough are free. A
+            fractional cpu_number, such as a share of a fractional cpu_provided, takes whole cores.
+        """
+        cpu_number = max(math.ceil(cpu_number), 1)
+        if cpu_number > self.get_free_core_number():
+            return None
+        fitting_node_list = [core_set for core_set in self.free_node_list if len(core_set) >= cpu_number]
+        if fitting_node_list:
+            core_set = min(fitting_node_list, key=len)
+            core_list = sorted(core_set)[:cpu_number]
+            core_set.difference_update(core_list)
+            return core_list
+        core_list = []
+        for core_set in sorted(self.free_node_list, key=len, reverse=True):
+            taken_core_list = sorted(core_set)[:cpu_number - len(core_list)]
+            core_set.difference_update(taken_core_list)
+            core_list.extend(taken_core_list)
+            if len(core_list) == cpu_number:
+                break
+        return core_list
+
+    def release(self, core_list):
+        for core in core_list:
+            self.free_node_list[self.get_node_index(core)].add(core)
+
+    def get_node_index(self, core):
+        for k, node_core_set in enumerate(self.node_core_list):
+            if core in node_core_set:
+                return k
+        raise ValueError("Core {} was not handed out by this placement".format(core))
@@ -0,0 +1,189 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import base64
+import json
+import os
+import subprocess
+import sys
+import threading
+from ideas1_utilities import ideas1_exit_watcher, ideas1_multiple_processing
+
+WORKER_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ideas1_worker.py")
+
+
+class ideas1_pool_job():
+    """ This class stands for a job running in a pool worker, in place of its Popen.
+        It serves as its own stream capture: with stdout_path / stderr_path the worker writes
+        the full outputs to these files, and only the last tail_size bytes come back.
+    """
+    def __init__(self, worker, args, stdout_path=None, stderr_path=None, tail_size=None):
+        self.worker = worker
+        self.args = args
+        self.pid = worker.pid
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        self.tail_size = tail_size
+        self.returncode = None
+        self.output_list = [b"", b""]
+        self.done_event = threading.Event()
+
+    def set_result(self, returncode, output_list):
+        self.output_list = output_list
+        self.returncode = returncode
+        self.done_event.set()
+
+    def poll(self):
+        return self.returncode
+
+    def wait(self, timeout=None):
+        self.done_event.wait(timeout)
+        return self.returncode
+
+    def communicate(self):
+        self.wait()
+        return self.output_list[0], self.output_list[1]
+
+    def join(self):
+        return self.communicate()
+
+    def kill(self):
+        # A running callable cannot be stopped alone, the worker goes with it
+        if self.worker.job is self:
+            self.worker.process.kill()
+
+
+class ideas1_pool_worker():
+    """ This class is the runner side of one pre-started worker process of the pool. """
+    def __init__(self, preload_module_list, env, watcher):
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT_PATH] + preload_module_list,
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        env=env)
+        self.pid = self.process.pid
+        self.job = None
+        self.is_alive = True
+        self.watcher = watcher
+        threading.Thread(target=self.read_messages, daemon=True).start()
+
+    def run(self, job):
+        self.job = job
+        message = {"command": job.args, "stdout_path": job.stdout_path, "stderr_path": job.stderr_path,
+                   "tail_size": job.tail_size}
+        try:
+            self.process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+            self.process.stdin.flush()
+        except OSError:
+            # The reader thread finds out the worker is gone and fails the job
+            pass
+
+    def read_messages(self):
+        for line in self.process.stdout:
+            message = json.loads(line)
+            job, self.job = self.job, None
+            job.set_result(message["returncode"], [base64.b64decode(output) for output in message["outputs"]])
+            self.watcher.exit_queue.put((job, None))
+        self.is_alive = False
+        self.process.wait()
+        job, self.job = self.job, None
+        if job is not None:
+            # -9 when the job was killed on timeout
+            job.set_result(self.process.returncode,
+                           [b"", "<?> The pool worker {0} exited while running the job\n".format(self.pid).encode("utf-8")])
+            self.watcher.exit_queue.put((job, None))
+
+    def close(self):
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.process.wait()
+
+
+class ideas1_pool_exit_watcher(ideas1_exit_watcher):
+    """ The pool workers put the exits of their jobs into exit_queue themselves. """
+    @staticmethod
+    def is_pidfd_supported():
+        return False
+
+    def register(self, process):
+        pass
+
+
+class ideas1_pool_multiple_processing(ideas1_multiple_processing):
+    """ This class runs Python callables in a pool of worker processes started once and reused
+        from job to job, instead of a fresh interpreter per job. A job is "module:function"
+        followed by its arguments, each read as a Python literal when it is one:
+
+        input_job_list = ["add_two_nums:add_two_nums 1 2",
+                          "add_two_nums:add_two_nums 3 4"]
+        run = ideas1_pool_multiple_processing(5, input_job_list, preload_module_list=["add_two_nums"])
+        run.run_all_for_executable(timeout=100)
+        run.close()
+
+        The job returncode is 0 when the function returns, the code of a SystemExit, or 1 on an
+        exception. At most worker_number workers (by default cpu_provided) are started,
+        with the modules of preload_module_list imported, and the cpu usage of the jobs is counted
+        as usual. A job reaching its timeout is killed with its worker, which is replaced by a
+        new one. The jobs share the state of their worker, so they should not rely on globals.
+    """
+    is_speculation_supported = False
+
+    def __init__(self, cpu_provided, input_job_list, input_cpu_usage_list=None, env=None,
+                 preload_module_list=None, worker_number=None, **kwargs):
+        super().__init__(cpu_provided, input_job_list, input_cpu_usage_list, env, **kwargs)
+        self.preload_module_list = preload_module_list if preload_module_list is not None else []
+        self.worker_number = worker_number if worker_number is not None else cpu_provided
+        self.worker_list = []
+
+    def create_watcher(self):
+        watcher = ideas1_pool_exit_watcher()
+        self.worker_list = [worker for worker in self.worker_list if worker.is_alive]
+        for worker in self.worker_list:
+            worker.watcher = watcher
+        while len(self.worker_list) < self.worker_number:
+            self.worker_list.append(ideas1_pool_worker(self.preload_module_list, self.env, watcher))
+        return watcher
+
+    def find_worker(self):
+        """ Return an idle worker, started if needed, None when all the workers are busy. """
+        self.worker_list = [worker for worker in self.worker_list if worker.is_alive]
+        for worker in self.worker_list:
+            if worker.job is None:
+                return worker
+        if len(self.worker_list) < self.worker_number:
+            self.worker_list.append(ideas1_pool_worker(self.preload_module_list, self.env, self.watcher))
+            return self.worker_list[-1]
+        return None
+
+    def can_launch_job(self, i):
+        return self.find_worker() is not None
+
+    def launch_job(self, i):
+        worker = self.find_worker()
+        self.launched_job_count += 1
+        print("    |  ({0}/{1}) Run job in worker {2}: {3}".format(self.launched_job_count, len(self.job_list),
+                                                                    worker.pid, self.input_job_list[i]))
+        job = ideas1_pool_job(worker, self.job_list[i], *self.get_job_log_path_list(i),
+                              tail_size=self.output_tail_size if self.stream_output else None)
+        if self.journal is not None:
+            self.journal.write_running(self.job_list, i, None)
+        worker.run(job)
+        self.add_working_job(i, job, job if self.stream_output else None, self.pin_job(job, i))
+
+    def finish_job(self, j, rusage=None):
+        job = self.working_job_list[j]
+        is_pinned = self.working_job_core_list[j] is not None
+        super().finish_job(j, rusage)
+        if is_pinned:
+            # The worker goes on with the next jobs, give it back all the cores
+            try:
+                os.sched_setaffinity(job.pid, os.sched_getaffinity(0))
+            except OSError:
+                pass
+
+    def close(self):
+        for worker in self.worker_list:
+            worker.close()
+        self.worker_list = []
+
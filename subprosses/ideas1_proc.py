@@ -0,0 +1,150 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import os
+
+CLOCK_TICKS_PER_SECOND = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def read_meminfo(path="/proc/meminfo"):
+    """ Return /proc/meminfo as a dict of kilobytes, empty when it is not available. """
+    meminfo_dict = {}
+    try:
+        with open(path) as meminfo_file:
+            for line in meminfo_file:
+                name, value = line.split(":", 1)
+                meminfo_dict[name] = int(value.split()[0])
+    except OSError:
+        pass
+    return meminfo_dict
+
+
+def read_status(pid):
+    """ Return /proc/<pid>/status as a dict of strings, empty once the process is gone. """
+    status_dict = {}
+    try:
+        with open("/proc/{}/status".format(pid)) as status_file:
+            for line in status_file:
+                name, value = line.split(":", 1)
+                status_dict[name] = value.strip()
+    except (OSError, ValueError):
+        pass
+    return status_dict
+
+
+def get_status_kb(status_dict, name):
+    if name not in status_dict:
+        return 0
+    return int(status_dict[name].split()[0])
+
+
+def get_child_pid_dict():
+    """ Map every pid to the pids of its children by scanning /proc/<pid>/stat. """
+    child_pid_dict = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/{}/stat".format(name)) as stat_file:
+                stat = stat_file.read()
+        except OSError:
+            continue
+        # The command name may hold spaces and parentheses, the fields start after the last ")"
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        child_pid_dict.setdefault(ppid, []).append(int(name))
+    return child_pid_dict
+
+
+def get_process_tree_pid_list(pid_list, child_pid_dict=None):
+    """ Return the given pids followed by all their descendants. """
+    if child_pid_dict is None:
+        child_pid_dict = get_child_pid_dict()
+    tree_pid_list = list(pid_list)
+    k = 0
+    while k < len(tree_pid_list):
+        tree_pid_list.extend(child_pid_dict.get(tree_pid_list[k], []))
+        k += 1
+    return tree_pid_list
+
+
+def get_process_tree_rss_kb(pid, child_pid_dict=None):
+    """ Return the resident memory of a process and its descendants in kilobytes. """
+    return sum(get_status_kb(read_status(tree_pid), "VmRSS")
+               for tree_pid in get_process_tree_pid_list([pid], child_pid_dict))
+
+
+def read_stat_field_list(pid):
+    """ Return the fields of /proc/<pid>/stat from the state on (field 3), None once the process is gone. """
+    try:
+        with open("/proc/{}/stat".format(pid)) as stat_file:
+            stat = stat_file.read()
+    except OSError:
+        return None
+    # The command name may hold spaces and parentheses, the fields start after the last ")"
+    return stat[stat.rindex(")") + 2:].split()
+
+
+def read_io(pid):
+    """ Return /proc/<pid>/io as a dict of ints, empty when it is not readable. """
+    io_dict = {}
+    try:
+        with open("/proc/{}/io".format(pid)) as io_file:
+            for line in io_file:
+                name, value = line.split(":", 1)
+                io_dict[name] = int(value)
+    except (OSError, ValueError):
+        pass
+    return io_dict
+
+
+def get_process_tree_usage(pid, child_pid_dict=None):
+    """ Return the cpu time in seconds, the resident memory in kilobytes and the bytes read and
+        written from storage of a process and its descendants, as a dict. Only the live processes
+        are read: the exited descendants are counted in the cpu time and the io of their parent
+        once it has reaped them.
+    """
+    usage_dict = {"cpu_time": 0.0, "rss_kb": 0, "read_bytes": 0, "write_bytes": 0}
+    for tree_pid in get_process_tree_pid_list([pid], child_pid_dict):
+        field_list = read_stat_field_list(tree_pid)
+        if field_list is None:
+            continue
+        # utime, stime, cutime and cstime are the fields 14 to 17
+        usage_dict["cpu_time"] += sum(int(field) for field in field_list[11:15]) / CLOCK_TICKS_PER_SECOND
+        usage_dict["rss_kb"] += get_status_kb(read_status(tree_pid), "VmRSS")
+        io_dict = read_io(tree_pid)
+        usage_dict["read_bytes"] += io_dict.get("read_bytes", 0)
+        usage_dict["write_bytes"] += io_dict.get("write_bytes", 0)
+    return usage_dict
+
+
+def read_process_start_time(pid):
+    """ Return the start time of a process in clock ticks after boot, None once it has exited
+        (zombies included). Together with the pid it identifies a process, as pids are reused.
+    """
+    field_list = read_stat_field_list(pid)
+    # The start time is field 22
+    if field_list is None or field_list[0] in ("Z", "X"):
+        return None
+    return int(field_list[19])
+
+
+def read_loadavg(path="/proc/loadavg"):
+    """ Return the load averages over 1, 5 and 15 minutes, None when they are not available. """
+    try:
+        with open(path) as loadavg_file:
+            return [float(field) for field in loadavg_file.read().split()[:3]]
+    except (OSError, ValueError):
+        return None
+
+
+def read_cpu_time(path="/proc/stat"):
+    """ Return the idle and total clock ticks of all the cpus since boot, None when they are not
+        available. Waiting for io counts as idle: the cpu could run another job meanwhile.
+    """
+    try:
+        with open(path) as stat_file:
+            # user nice system idle iowait irq softirq steal, guest is already counted in user
+            tick_list = [int(field) for field in stat_file.readline().split()[1:9]]
+    except (OSError, ValueError):
+        return None
+    return tick_list[3] + tick_list[4], sum(tick_list)
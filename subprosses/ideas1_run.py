@@ -0,0 +1,115 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import argparse
+import sys
+from ideas1_scheduling import ideas1_backfill_policy, ideas1_critical_path_policy, ideas1_fifo_policy, \
+    ideas1_largest_first_policy, ideas1_longest_first_policy
+from ideas1_utilities import ideas1_multiple_processing
+
+POLICY_DICT = {"fifo": ideas1_fifo_policy,
+               "largest-first": ideas1_largest_first_policy,
+               "longest-first": ideas1_longest_first_policy,
+               "critical-path": ideas1_critical_path_policy,
+               "backfill": ideas1_backfill_policy}
+
+
+def read_job_file(job_file):
+    """ Return the commands and cpu usages of a job file: one command per line, optionally
+        after its cpu usage, a whole number, and a tab. Empty lines and lines starting with #
+        are skipped. Raise ValueError on a line whose cpu usage cannot be read.
+    """
+    input_job_list = []
+    input_cpu_usage_list = []
+    for line_number, line in enumerate(job_file, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        cpu_usage, _, command = line.partition("\t")
+        if command:
+            if not cpu_usage.strip().isdigit() or int(cpu_usage) < 1:
+                raise ValueError("<?> Line {0} of the job file does not start with a whole number of cpus "
+                                 "and a tab: {1}!".format(line_number, line))
+            input_cpu_usage_list.append(int(cpu_usage))
+            input_job_list.append(command.strip())
+        else:
+            input_cpu_usage_list.append(1)
+            input_job_list.append(line)
+    return input_job_list, input_cpu_usage_list
+
+
+def parse_argument(argument_list=None):
+    parser = argparse.ArgumentParser(prog="python -m ideas1_run",
+                                     description="Run the jobs of a job file on a given number of cpus.")
+    parser.add_argument("job_file", nargs="?", default="-", help="file of the commands, - (default) for stdin")
+    parser.add_argument("--cpus", type=float, required=True, help="cpus shared by the jobs")
+    parser.add_argument("--cpu-floor", type=float, default=None,
+                        help="adapt the cpus to the load of the machine, between this floor and --cpus")
+    parser.add_argument("--timeout", type=float, default=None, help="timeout of every job in seconds")
+    parser.add_argument("--kill-grace-period", type=float, default=10.0, help="seconds between SIGTERM and SIGKILL")
+    parser.add_argument("--policy", choices=sorted(POLICY_DICT), default=None, help="order of the launches")
+    parser.add_argument("--log", default=None, help="log file of the job outputs")
+    parser.add_argument("--job-log-dir", default=None, help="directory of the full outputs of every job")
+    parser.add_argument("--stream-output", action="store_true", help="read the outputs while the jobs run")
+    parser.add_argument("--pin-cores", action="store_true", help="bind every job to its own cores")
+    parser.add_argument("--speculation-factor", type=float, default=None,
+                        help="run again the jobs this many times slower than expected, once the queue is empty")
+    parser.add_argument("--batch-runtime", type=float, default=None, help="run the short jobs in batches of this length")
+    parser.add_argument("--history", default=None, help="SQLite file of the past runtimes")
+    parser.add_argument("--cache-dir", default=None, help="directory of the cached job results")
+    parser.add_argument("--journal", default=None, help="journal file to resume an interrupted run")
+    parser.add_argument("--telemetry-csv", default=None, help="csv file of the cpu, memory and io used by every job")
+    parser.add_argument("--trace", default=None, help="Chrome trace file of the timeline")
+    parser.add_argument("--plot", default=None, help="image file of the Gantt chart of the timeline")
+    return parser.parse_args(argument_list)
+
+
+def main(argument_list=None):
+    """ Run a job file and return 0 when every job succeeded, 1 otherwise, 2 when the job file cannot be read.
+        The optional features are imported only when asked for, to keep the start fast.
+    """
+    args = parse_argument(argument_list)
+    try:
+        if args.job_file == "-":
+            input_job_list, input_cpu_usage_list = read_job_file(sys.stdin)
+        else:
+            with open(args.job_file) as job_file:
+                input_job_list, input_cpu_usage_list = read_job_file(job_file)
+    except ValueError as error:
+        print(error)
+        return 2
+    option_dict = {}
+    if args.policy is not None:
+        option_dict["scheduling_policy"] = POLICY_DICT[args.policy]()
+    if args.history is not None:
+        from ideas1_history import ideas1_runtime_history
+        option_dict["history"] = ideas1_runtime_history(args.history)
+    if args.cache_dir is not None:
+        from ideas1_cache import ideas1_result_cache
+        option_dict["result_cache"] = ideas1_result_cache(args.cache_dir)
+    if args.journal is not None:
+        from ideas1_journal import ideas1_job_journal
+        option_dict["journal"] = ideas1_job_journal(args.journal)
+    if args.telemetry_csv is not None:
+        from ideas1_telemetry import ideas1_job_telemetry
+        option_dict["telemetry"] = ideas1_job_telemetry(csv_path=args.telemetry_csv)
+    if args.cpu_floor is not None:
+        from ideas1_concurrency import ideas1_adaptive_cpu_budget
+        option_dict["cpu_controller"] = ideas1_adaptive_cpu_budget(args.cpu_floor, args.cpus)
+    run = ideas1_multiple_processing(args.cpus, input_job_list, input_cpu_usage_list, **option_dict)
+    if not run.job_list:
+        return 0
+    run.run_all_for_executable(log_file_path=args.log, timeout=args.timeout, stream_output=args.stream_output,
+                               job_log_dir=args.job_log_dir, pin_cores=args.pin_cores,
+                               batch_runtime=args.batch_runtime, kill_grace_period=args.kill_grace_period,
+                               speculation_factor=args.speculation_factor)
+    if args.trace is not None:
+        run.write_chrome_trace(args.trace)
+    if args.plot is not None:
+        run.plot_timeline(args.plot)
+    is_failed = run.skipped_job_set or any(returncode != 0 for returncode in run.job_returncode_dict.values())
+    return 1 if is_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import heapq
+
+
+def is_fitting(resource_list, free_resource_list):
+    return all(resource <= free_resource for resource, free_resource in zip(resource_list, free_resource_list))
+
+
+def add_resource_list(resource_list, other_resource_list):
+    return [resource + other_resource for resource, other_resource in zip(resource_list, other_resource_list)]
+
+
+def subtract_resource_list(resource_list, other_resource_list):
+    return [resource - other_resource for resource, other_resource in zip(resource_list, other_resource_list)]
+
+
+class ideas1_fifo_policy():
+    """ This class launches the queued jobs strictly in the given order: the head of the queue
+        waits until enough cpus are free and no job behind it may overtake it.
+
+        The other policies derive from it. sort_queue orders the job indices before the batch
+        starts, and again each time jobs become ready as the jobs they depend on finish.
+        select_job_list returns the queued jobs to launch now, in launch order.
+        A job fits when every resource it uses (cpus, memory) is free, see run.get_job_resource_list.
+    """
+    def sort_queue(self, run, queued_job_index_list):
+        return list(queued_job_index_list)
+
+    def select_job_list(self, run, queued_job_index_list, now):
+        free_resource_list = run.get_free_resource_list()
+        selected_job_list = []
+        for i in queued_job_index_list:
+            if not is_fitting(run.get_job_resource_list(i), free_resource_list):
+                break
+            selected_job_list.append(i)
+            free_resource_list = subtract_resource_list(free_resource_list, run.get_job_resource_list(i))
+        return selected_job_list
+
+
+class ideas1_priority_policy(ideas1_fifo_policy):
+    """ This class launches the jobs with the highest priority first.
+        Jobs of equal priority keep their order, jobs missing from priority_list get priority 0.
+    """
+    def __init__(self, priority_list):
+        self.priority_list = priority_list
+
+    def get_priority(self, i):
+        if i < len(self.priority_list):
+            return self.priority_list[i]
+        return 0
+
+    def sort_queue(self, run, queued_job_index_list):
+        return sorted(queued_job_index_list, key=lambda i: -self.get_priority(i))
+
+
+class ideas1_largest_first_policy(ideas1_fifo_policy):
+    """ This class packs the cpus first-fit decreasing: the queue is sorted by cpu usage and every
+        job that fits in the free cpus is launched, so small jobs fill the gaps left by large ones.
+    """
+    def sort_queue(self, run, queued_job_index_list):
+        return sorted(queued_job_index_list, key=lambda i: -run.get_job_cpu_usage(i))
+
+    def select_job_list(self, run, queued_job_index_list, now):
+        free_resource_list = run.get_free_resource_list()
+        selected_job_list = []
+        for i in queued_job_index_list:
+            if is_fitting(run.get_job_resource_list(i), free_resource_list):
+                selected_job_list.append(i)
+                free_resource_list = subtract_resource_list(free_resource_list, run.get_job_resource_list(i))
+        return selected_job_list
+
+
+class ideas1_longest_first_policy(ideas1_largest_first_policy):
+    """ This class is longest-processing-time-first list scheduling on the runtimes predicted by
+        the runner from its history. Jobs without a prediction go first, as they may be the longest,
+        and every job that fits in the free cpus is launched.
+    """
+    def sort_queue(self, run, queued_job_index_list):
+        def get_sort_key(i):
+            estimated_runtime = run.get_estimated_runtime(i)
+            if estimated_runtime is None:
+                return 0, 0
+            return 1, -estimated_runtime
+        return sorted(queued_job_index_list, key=get_sort_key)
+
+
+class ideas1_critical_path_policy(ideas1_largest_first_policy):
+    """ This class is for jobs depending on each other (input_dependency_list of the runner).
+        The ready jobs are sorted by the length of the longest chain of runtimes from the job to
+        the end of the batch, so the jobs holding back the most work start first, and every job
+        that fits in the free cpus is launched. The runtimes are predicted from the history of
+        the runner, the jobs without a prediction count for the median of the predictions, or for
+        one second when there is none.
+    """
+    def __init__(self):
+        self.rank_list = None
+
+    def get_rank_list(self, run):
+        if self.rank_list is None:
+            runtime_list = [run.get_estimated_runtime(i) for i in range(len(run.job_list))]
+            known_runtime_list = sorted(runtime for runtime in runtime_list if runtime is not None)
+            default_runtime = known_runtime_list[len(known_runtime_list) // 2] if known_runtime_list else 1.0
+            self.rank_list = [0.0 for _ in range(len(run.job_list))]
+            for i in reversed(run.topological_order_list):
+                self.rank_list[i] = ((default_runtime if runtime_list[i] is None else runtime_list[i]) +
+                                     max([self.rank_list[child] for child in run.child_job_list[i]] + [0.0]))
+        return self.rank_list
+
+    def sort_queue(self, run, queued_job_index_list):
+        rank_list = self.get_rank_list(run)
+        return sorted(queued_job_index_list, key=lambda i: -rank_list[i])
+
+
+class ideas1_backfill_policy(ideas1_fifo_policy):
+    """ This class is EASY backfilling on top of the FIFO order.
+        When the head of the queue does not fit, the time it will fit (the shadow time) is
+        computed from the estimated runtimes of the working jobs. A job behind the head may
+        then start if it fits now and either ends before the shadow time or only uses the
+        resources the head will leave free, so the head is never delayed by the jobs overtaking it.
+
+        estimated_runtime_list holds seconds per job, None for unknown. Without it the runtimes
+        predicted by the runner from its history are used. A working job without an estimate is
+        never expected to end, so only the resources left free by the head are backfilled.
+    """
+    def __init__(self, estimated_runtime_list=None):
+        self.estimated_runtime_list = estimated_runtime_list
+
+    def get_estimated_runtime(self, run, i):
+        if self.estimated_runtime_list is None:
+            return run.get_estimated_runtime(i)
+        if i < len(self.estimated_runtime_list):
+            return self.estimated_runtime_list[i]
+        return None
+
+    def select_job_list(self, run, queued_job_index_list, now):
+        selected_job_list = super().select_job_list(run, queued_job_index_list, now)
+        remaining_job_list = queued_job_index_list[len(selected_job_list):]
+        if not remaining_job_list:
+            return selected_job_list
+
+        free_resource_list = run.get_free_resource_list()
+        for i in selected_job_list:
+            free_resource_list = subtract_resource_list(free_resource_list, run.get_job_resource_list(i))
+        release_list = []
+        for i, start_time in zip(run.working_job_index_list, run.working_job_start_time_list):
+            if self.get_estimated_runtime(run, i) is not None:
+                release_list.append((start_time + self.get_estimated_runtime(run, i), run.get_job_resource_list(i)))
+        for i in selected_job_list:
+            if self.get_estimated_runtime(run, i) is not None:
+                release_list.append((now + self.get_estimated_runtime(run, i), run.get_job_resource_list(i)))
+
+        head_resource_list = run.get_job_resource_list(remaining_job_list[0])
+        shadow_time = None
+        extra_resource_list = [0 for _ in head_resource_list]
+        available_resource_list = free_resource_list
+        for end_time, resource_list in sorted(release_list, key=lambda release: release[0]):
+            available_resource_list = add_resource_list(available_resource_list, resource_list)
+            if is_fitting(head_resource_list, available_resource_list):
+                shadow_time = max(end_time, now)
+                extra_resource_list = subtract_resource_list(available_resource_list, head_resource_list)
+                break
+
+        for i in remaining_job_list[1:]:
+            resource_list = run.get_job_resource_list(i)
+            if not is_fitting(resource_list, free_resource_list):
+                continue
+            estimated_runtime = self.get_estimated_runtime(run, i)
+            if shadow_time is not None and estimated_runtime is not None and now + estimated_runtime <= shadow_time:
+                pass
+            elif is_fitting(resource_list, extra_resource_list):
+                extra_resource_list = subtract_resource_list(extra_resource_list, resource_list)
+            else:
+                continue
+            selected_job_list.append(i)
+            free_resource_list = subtract_resource_list(free_resource_list, resource_list)
+        return selected_job_list
+
+
+def estimate_makespan(runtime_list, cpu_usage_list, cpu_provided, parent_list=None):
+    """ Simulate launching the jobs in the given order, each one as soon as enough cpus are free,
+        and return the time the last one ends. With parent_list, the positions in the given order
+        of the jobs each job depends on, a job also waits for the end of its parents.
+    """
+    now = 0
+    cpu_free = cpu_provided
+    release_heap = []
+    end_time_list = []
+    for k, (runtime, cpu_usage) in enumerate(zip(runtime_list, cpu_usage_list)):
+        cpu_usage = min(cpu_usage, cpu_provided)
+        while cpu_free < cpu_usage:
+            now, cpu_released = heapq.heappop(release_heap)
+            cpu_free += cpu_released
+        if parent_list is not None:
+            now = max([now] + [end_time_list[parent] for parent in parent_list[k]])
+        end_time_list.append(now + runtime)
+        heapq.heappush(release_heap, (now + runtime, cpu_usage))
+        cpu_free -= cpu_usage
+    return max(end_time_list + [now])
@@ -0,0 +1,306 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import argparse
+import collections
+import json
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from ideas1_sweep import ideas1_sliding_list
+from ideas1_utilities import ideas1_multiple_processing
+
+
+def send_request(socket_path, message):
+    """ Send one request to an ideas1_scheduler_service and return its reply. """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(message) + "\n").encode("utf-8"))
+        return json.loads(connection.makefile('rb').readline())
+    finally:
+        connection.close()
+
+
+class ideas1_scheduler_service(ideas1_multiple_processing):
+    """ This class keeps running and shares one cpu budget between all the jobs submitted to it,
+        so several users and tools on one machine do not oversubscribe it. The requests are JSON
+        lines over a Unix domain socket, each answered by one JSON line:
+
+        {"type": "submit", "command": "...", "cpu_usage": 1, "memory_usage": 0}  -> {"job": n}
+        {"type": "status"} or {"type": "status", "job": n}  -> the state of all jobs or of job n
+        {"type": "cancel", "job": n}  -> a queued job is dropped, a running one terminated
+        {"type": "shutdown"}  -> no more submissions, the service exits once its jobs are done
+
+        The jobs are numbered from 1 and go through queued, running, then finished, failed,
+        cancelled or skipped. A cancelled job running in a batch takes its whole batch down.
+        The submitted commands run as the user of the service: the socket is only open to this
+        user unless socket_mode says otherwise (0o660 for the group). Start it with
+
+        python ideas1_service.py --socket /tmp/ideas1.sock serve --cpus 8
+
+        and the run_all_for_executable options (timeout, job_log_dir ...) go to serve_forever.
+        As in ideas1_sweep, a job is forgotten once it is done: only the status of the last
+        keep_finished done jobs is kept, and the timeline only holds the working jobs.
+    """
+    def __init__(self, cpu_provided, socket_path, socket_mode=0o600, keep_finished=1000, **kwargs):
+        super().__init__(cpu_provided, ideas1_sliding_list(), **kwargs)
+        self.socket_path = socket_path
+        self.socket_mode = socket_mode
+        self.request_queue = queue.Queue()
+        self.cancelled_job_set = set()
+        self.is_shutting_down = False
+        self.client_dict = {}  # client thread -> its connection
+        self.estimated_runtime_dict = {}
+        self.job_list = ideas1_sliding_list()
+        self.cpu_usage_list = ideas1_sliding_list()
+        self.memory_usage_list = ideas1_sliding_list()
+        self.dependency_list = ideas1_sliding_list()
+        self.child_job_list = ideas1_sliding_list()
+        self.finished_job_list = collections.deque(maxlen=keep_finished)
+        # job -> status of the done jobs, the oldest first
+        self.done_job_status_dict = collections.OrderedDict()
+        self.keep_finished = keep_finished
+
+    def init_command_line_list(self):
+        # The jobs are submitted later
+        pass
+
+    def submit_job(self, command, cpu_usage=1, memory_usage=0):
+        i = self.add_job(command, cpu_usage, memory_usage)
+        if self.journal is not None:
+            self.journal.write_queued(self.job_list, [i])
+        self.queued_job_index_list = self.scheduling_policy.sort_queue(self, self.queued_job_index_list + [i])
+        print("    |  Submitted job {0}: {1}".format(i + 1, command))
+        return i
+
+    def get_estimated_runtime(self, i):
+        if self.history is None:
+            return None
+        if i not in self.estimated_runtime_dict:
+            self.estimated_runtime_dict[i] = self.history.predict_runtime(self.job_list[i])
+        return self.estimated_runtime_dict[i]
+
+    def release_dependent_jobs(self, i, returncode):
+        super().release_dependent_jobs(i, returncode)
+        self.forget_job(i)
+
+    def forget_job(self, i):
+        """ Keep only the status of a done job, and drop the oldest statuses past keep_finished. """
+        self.done_job_status_dict[i] = self.get_job_status(i)
+        while len(self.done_job_status_dict) > self.keep_finished:
+            self.done_job_status_dict.popitem(last=False)
+        self.cancelled_job_set.discard(i)
+        self.job_returncode_dict.pop(i, None)
+        for job_list in (self.input_job_list, self.job_list, self.cpu_usage_list, self.memory_usage_list,
+                         self.dependency_list, self.child_job_list):
+            job_list.release(i)
+        self.estimated_runtime_dict.pop(i, None)
+
+    def finish_job(self, j, rusage=None):
+        timeline_dict = self.working_job_timeline_list[j]
+        super().finish_job(j, rusage)
+        self.timeline_list = [working_timeline_dict for working_timeline_dict in self.timeline_list
+                              if working_timeline_dict is not timeline_dict]
+
+    def get_working_position(self, i):
+        """ Return the position in the working lists of the process running job i, None if it is not running. """
+        for j, working_job_index in enumerate(self.working_job_index_list):
+            if working_job_index == i or (working_job_index in self.batch_job_dict and
+                                          i in self.batch_job_dict[working_job_index][0]):
+                return j
+        return None
+
+    def get_job_state(self, i):
+        if i in self.cancelled_job_set:
+            return "cancelled"
+        if i in self.job_returncode_dict:
+            return "finished" if self.job_returncode_dict[i] == 0 else "failed"
+        if i in self.skipped_job_set:
+            return "skipped"
+        if self.get_working_position(i) is not None:
+            return "running"
+        return "queued"
+
+    def get_job_status(self, i):
+        if i in self.done_job_status_dict:
+            return self.done_job_status_dict[i]
+        return {"job": i + 1, "command": self.input_job_list[i], "cpu_usage": self.cpu_usage_list[i],
+                "state": self.get_job_state(i), "returncode": self.job_returncode_dict.get(i)}
+
+    def cancel_job(self, i):
+        state = self.get_job_state(i)
+        if state == "queued":
+            if i in self.queued_job_index_list:
+                self.queued_job_index_list.remove(i)
+            for follower_list in self.cache_follower_dict.values():
+                if i in follower_list:
+                    follower_list.remove(i)
+            self.cancelled_job_set.add(i)
+            self.forget_job(i)
+        elif state == "running":
+            process = self.working_job_list[self.get_working_position(i)]
+            self.cancelled_job_set.add(i)
+            self.terminate_job(process)
+        return state
+
+    def handle_request(self, message):
+        if message["type"] == "submit":
+            if self.is_shutting_down:
+                return {"error": "The service is shutting down"}
+            return {"job": self.submit_job(message["command"], message.get("cpu_usage", 1),
+                                           message.get("memory_usage", 0)) + 1}
+        if message["type"] == "shutdown":
+            self.is_shutting_down = True
+            return {"queued": len(self.queued_job_index_list), "running": len(self.working_job_list)}
+        if message["type"] == "status" and message.get("job") is None:
+            return {"cpu_provided": self.cpu_provided, "cpu_used": self.cpu_used,
+                    "job_list": [self.get_job_status(i) for i in sorted(self.done_job_status_dict.keys() |
+                                                                        self.input_job_list.item_dict.keys())]}
+        i = int(message["job"]) - 1
+        if i not in self.done_job_status_dict and i not in self.input_job_list.item_dict:
+            if 0 <= i < len(self.job_list):
+                return {"error": "Job {} is done and forgotten".format(message["job"])}
+            return {"error": "Unknown job {}".format(message["job"])}
+        if message["type"] == "status":
+            return self.get_job_status(i)
+        if message["type"] == "cancel":
+            return {"job": i + 1, "state": self.cancel_job(i)}
+        return {"error": "Unknown request type {}".format(message["type"])}
+
+    def handle_requests(self):
+        while True:
+            try:
+                message, reply_queue = self.request_queue.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                reply_queue.put(self.handle_request(message))
+            except (KeyError, TypeError, ValueError) as error:
+                reply_queue.put({"error": "Bad request: {}".format(error)})
+
+    def accept_connections(self, server):
+        while True:
+            try:
+                connection, _ = server.accept()
+            except OSError:
+                # Closed at shutdown
+                return
+            client_thread = threading.Thread(target=self.serve_client, args=(connection,), daemon=True)
+            self.client_dict[client_thread] = connection
+            client_thread.start()
+
+    def serve_client(self, connection):
+        """ Pass the requests of a client to the scheduler loop, which alone touches the jobs. """
+        try:
+            for line in connection.makefile('rb'):
+                reply_queue = queue.Queue()
+                try:
+                    self.request_queue.put((json.loads(line), reply_queue))
+                except ValueError:
+                    reply_queue.put({"error": "The request is not JSON"})
+                self.watcher.wake()
+                connection.sendall((json.dumps(reply_queue.get()) + "\n").encode("utf-8"))
+        except OSError:
+            pass
+        finally:
+            connection.close()
+            self.client_dict.pop(threading.current_thread(), None)
+
+    def close_clients(self):
+        """ Stop reading requests and answer the ones already sent, before the service exits. """
+        for connection in list(self.client_dict.values()):
+            try:
+                connection.shutdown(socket.SHUT_RD)
+            except OSError:
+                # Closed meanwhile
+                pass
+        for client_thread in list(self.client_dict):
+            while client_thread.is_alive():
+                self.handle_requests()
+                client_thread.join(0.05)
+
+    def serve_forever(self, **run_option_dict):
+        print(time.time())
+        print("    Serving on {0} with {1} cpus ...".format(self.socket_path, self.cpu_provided))
+        self.open_run(**run_option_dict)
+        if os.path.exists(self.socket_path):
+            try:
+                send_request(self.socket_path, {"type": "status", "job": 0})
+                raise OSError("Another service already listens on {}".format(self.socket_path))
+            except ConnectionRefusedError:
+                # Left by a service that died
+                os.remove(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        os.chmod(self.socket_path, self.socket_mode)
+        server.listen()
+        accept_thread = threading.Thread(target=self.accept_connections, args=(server,), daemon=True)
+        accept_thread.start()
+        try:
+            while True:
+                try:
+                    self.handle_requests()
+                    self.launch_selected_jobs()
+                    self.launch_speculative_jobs()
+                    if self.is_shutting_down and not self.queued_job_index_list and not self.working_job_list:
+                        break
+                    # Also woken by every request
+                    self.wait_for_working_jobs()
+                except Exception:
+                    # The error of one job must not stop the jobs of the others
+                    traceback.print_exc()
+                    print("<?> The service goes on after the error above!")
+        finally:
+            # close() alone does not wake accept() on Linux
+            try:
+                server.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            server.close()
+            accept_thread.join()
+            os.remove(self.socket_path)
+            self.close_clients()
+            if self.working_job_list:
+                print("<?> The service stopped early, its {} working jobs are terminated!".format(len(self.working_job_list)))
+                self.terminate_working_jobs()
+            self.close_run()
+        print("    The service has run {0} jobs on given {1} cpus...".format(len(self.job_list), self.cpu_provided))
+        print(time.time())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share the cpus of this machine between submitted jobs.")
+    parser.add_argument("--socket", default="/tmp/ideas1_service.sock", help="Unix socket of the service")
+    subparsers = parser.add_subparsers(dest="action", required=True)
+    serve_parser = subparsers.add_parser("serve", help="run the service")
+    serve_parser.add_argument("--cpus", type=int, default=os.cpu_count(), help="cpus shared by all the jobs")
+    serve_parser.add_argument("--timeout", type=float, default=None, help="timeout of every job in seconds")
+    serve_parser.add_argument("--log", default=None, help="log file of the job outputs")
+    serve_parser.add_argument("--job-log-dir", default=None, help="directory of the full outputs of every job")
+    serve_parser.add_argument("--socket-mode", type=lambda text: int(text, 8), default=0o600,
+                              help="permissions of the socket, in octal")
+    serve_parser.add_argument("--keep-finished", type=int, default=1000, help="done jobs whose status is kept")
+    submit_parser = subparsers.add_parser("submit", help="queue a command")
+    submit_parser.add_argument("command")
+    submit_parser.add_argument("--cpus", type=int, default=1, help="cpus used by the job")
+    submit_parser.add_argument("--memory", type=float, default=0, help="memory used by the job in MB")
+    status_parser = subparsers.add_parser("status", help="show all jobs, or one")
+    status_parser.add_argument("job", nargs="?", type=int, default=None)
+    cancel_parser = subparsers.add_parser("cancel", help="cancel a queued or running job")
+    cancel_parser.add_argument("job", type=int)
+    subparsers.add_parser("shutdown", help="stop once the submitted jobs are done")
+    args = parser.parse_args()
+    if args.action == "serve":
+        service = ideas1_scheduler_service(args.cpus, args.socket, args.socket_mode, args.keep_finished)
+        service.serve_forever(log_file_path=args.log, timeout=args.timeout, job_log_dir=args.job_log_dir)
+    else:
+        request_dict = {"type": args.action}
+        if args.action == "submit":
+            request_dict.update({"command": args.command, "cpu_usage": args.cpus, "memory_usage": args.memory})
+        elif args.action in ("status", "cancel"):
+            request_dict["job"] = args.job
+        print(json.dumps(send_request(args.socket, request_dict), indent=1))
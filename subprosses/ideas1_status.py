@@ -0,0 +1,39 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import os
+import signal
+import subprocess
+import sys
+
+
+def run_job(status_path, command):
+    """ Run command, write its returncode to status_path once it has exited, then exit as it did.
+        status_path is journaled, so a runner restarted after it died reads the exit status of a
+        job it did not start.
+    """
+    # SIGTERM and SIGINT are sent to the whole process group, the job handles them. A handler
+    # rather than SIG_IGN, which the job would inherit
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signal_number, lambda signal_number, frame: None)
+    try:
+        process = subprocess.Popen(command)
+    except OSError as error:
+        sys.stderr.write(str(error) + "\n")
+        returncode = 127
+    else:
+        returncode = process.wait()
+    temp_path = status_path + ".tmp"
+    with open(temp_path, 'w') as status_file:
+        status_file.write(str(returncode))
+    os.replace(temp_path, status_path)
+    if returncode < 0:
+        # Killed by a signal: die of it as well, for the runner to see the same returncode
+        signal.signal(-returncode, signal.SIG_DFL)
+        os.kill(os.getpid(), -returncode)
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    # Started by ideas1_multiple_processing.launch_job when the runner has a journal
+    run_job(sys.argv[1], sys.argv[2:])
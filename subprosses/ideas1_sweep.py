@@ -0,0 +1,169 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import collections
+import functools
+import itertools
+import math
+import operator
+import random
+import shlex
+from ideas1_utilities import ideas1_multiple_processing
+
+
+class ideas1_parameter_sweep():
+    """ This class produces the jobs of a parameter sweep one at a time, from a command template
+        with a {name} field per axis. By default every combination of the axes is run, the last
+        axis changing first:
+
+        sweep = ideas1_parameter_sweep("python add_two_nums.py {a} {b}", {"a": range(1000), "b": [1, 2, 3]})
+
+        With sample_number, as many combinations are drawn at random instead (without an end if
+        sample_number is float("inf")), and an axis may also be a function of a random.Random,
+        such as lambda rng: rng.uniform(0.1, 0.5). The values are quoted for the shell syntax of
+        the commands. cpu_usage and memory_usage are numbers, or functions of the dict of the
+        parameters of a job. size is the number of jobs, None for an endless sweep, which has
+        no len().
+    """
+    def __init__(self, command_template, axis_dict, sample_number=None, seed=None, cpu_usage=1, memory_usage=0):
+        if sample_number is not None and sample_number != float("inf") and \
+                (sample_number < 0 or sample_number != int(sample_number)):
+            raise ValueError("<?> The sample number {} is not a whole number!".format(sample_number))
+        self.command_template = command_template
+        self.axis_dict = axis_dict
+        self.sample_number = sample_number
+        self.seed = seed
+        self.cpu_usage = cpu_usage
+        self.memory_usage = memory_usage
+
+    @property
+    def size(self):
+        if self.sample_number is None:
+            return functools.reduce(operator.mul, (len(axis) for axis in self.axis_dict.values()), 1)
+        if self.sample_number == float("inf"):
+            return None
+        return int(self.sample_number)
+
+    def __len__(self):
+        if self.size is None:
+            raise TypeError("<?> An endless sweep has no length, see size!")
+        return self.size
+
+    def iter_parameter_dict(self):
+        name_list = list(self.axis_dict)
+        if self.sample_number is None:
+            for value_list in itertools.product(*self.axis_dict.values()):
+                yield dict(zip(name_list, value_list))
+            return
+        rng = random.Random(self.seed)
+        sample_count = 0
+        while sample_count < self.sample_number:
+            yield {name: axis(rng) if callable(axis) else rng.choice(axis) for name, axis in self.axis_dict.items()}
+            sample_count += 1
+
+    def __iter__(self):
+        """ Yield (command, cpu_usage, memory_usage) for every job of the sweep. """
+        for parameter_dict in self.iter_parameter_dict():
+            command = self.command_template.format(**{name: shlex.quote(str(value))
+                                                      for name, value in parameter_dict.items()})
+            yield (command,
+                   self.cpu_usage(parameter_dict) if callable(self.cpu_usage) else self.cpu_usage,
+                   self.memory_usage(parameter_dict) if callable(self.memory_usage) else self.memory_usage)
+
+
+class ideas1_sliding_list():
+    """ This class stands for a list of which only the items in use are kept: an item is added at
+        the end, read and replaced at its index, and released once its job is done. The length
+        counts the released items.
+    """
+    def __init__(self):
+        self.item_dict = {}
+        self.length = 0
+
+    def append(self, item):
+        self.item_dict[self.length] = item
+        self.length += 1
+
+    def release(self, i):
+        self.item_dict.pop(i, None)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, i):
+        return self.item_dict[i]
+
+    def __setitem__(self, i, item):
+        self.item_dict[i] = item
+
+
+class ideas1_sweep_multiple_processing(ideas1_multiple_processing):
+    """ This class runs the jobs of a sweep as they are produced, without building the job list
+        first, so a sweep of millions of jobs starts at once and in constant memory:
+
+        sweep = ideas1_parameter_sweep("python add_two_nums.py {a} {b}", {"a": range(1000), "b": range(1000)})
+        run = ideas1_sweep_multiple_processing(8, sweep)
+        run.run_all_for_executable(log_file_path="sweep.log", timeout=100)
+
+        input_sweep is any iterable of commands or of (command, cpu_usage, memory_usage) tuples.
+        The queue holds at most lookahead jobs (by default 4 per cpu, at least 16), which the
+        scheduling policy orders, and a job is forgotten once it is done: finished_job_list only
+        keeps the last ones, failed_job_number counts the jobs which did not return 0, and the
+        timeline only holds the working jobs unless keep_timeline. The journal, dependencies and
+        input_runtime_list need the whole job list and are not available.
+    """
+    def __init__(self, cpu_provided, input_sweep, lookahead=None, keep_timeline=False, **kwargs):
+        if kwargs.get("journal") is not None or kwargs.get("input_dependency_list") is not None:
+            raise ValueError("<?> The jobs of a sweep cannot have a journal or dependencies!")
+        super().__init__(cpu_provided, ideas1_sliding_list(), **kwargs)
+        self.sweep_iterator = iter(input_sweep)
+        self.is_sweep_done = False
+        self.lookahead = lookahead if lookahead is not None else max(4 * math.ceil(cpu_provided), 16)
+        self.keep_timeline = keep_timeline
+        self.failed_job_number = 0
+        self.estimated_runtime_dict = {}
+        self.job_list = ideas1_sliding_list()
+        self.cpu_usage_list = ideas1_sliding_list()
+        self.memory_usage_list = ideas1_sliding_list()
+        self.dependency_list = ideas1_sliding_list()
+        self.child_job_list = ideas1_sliding_list()
+        self.finished_job_list = collections.deque(maxlen=self.lookahead)
+
+    def init_command_line_list(self):
+        # The jobs are produced while the sweep runs
+        pass
+
+    def fill_queue(self):
+        new_job_list = []
+        while not self.is_sweep_done and len(self.queued_job_index_list) + len(new_job_list) < self.lookahead:
+            try:
+                job = next(self.sweep_iterator)
+            except StopIteration:
+                self.is_sweep_done = True
+                break
+            new_job_list.append(self.add_job(job) if isinstance(job, str) else self.add_job(*job))
+        if new_job_list:
+            self.queued_job_index_list = self.scheduling_policy.sort_queue(self, self.queued_job_index_list + new_job_list)
+
+    def get_estimated_runtime(self, i):
+        if self.history is None:
+            return None
+        if i not in self.estimated_runtime_dict:
+            self.estimated_runtime_dict[i] = self.history.predict_runtime(self.job_list[i])
+        return self.estimated_runtime_dict[i]
+
+    def release_dependent_jobs(self, i, returncode):
+        # Called last on a job done, from its result, the cache or its batch: nothing needs it any more
+        if returncode != 0:
+            self.failed_job_number += 1
+        for job_list in (self.input_job_list, self.job_list, self.cpu_usage_list, self.memory_usage_list,
+                         self.dependency_list, self.child_job_list):
+            job_list.release(i)
+        self.estimated_runtime_dict.pop(i, None)
+
+    def finish_job(self, j, rusage=None):
+        timeline_dict = self.working_job_timeline_list[j]
+        super().finish_job(j, rusage)
+        if not self.keep_timeline:
+            self.timeline_list = [working_timeline_dict for working_timeline_dict in self.timeline_list
+                                  if working_timeline_dict is not timeline_dict]
@@ -0,0 +1,123 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import csv
+import json
+import time
+from ideas1_proc import get_child_pid_dict, get_process_tree_usage
+
+TELEMETRY_FIELD_LIST = ["job", "command", "cpu_requested", "cores_used", "cpu_efficiency", "wall_time", "cpu_time",
+                        "peak_rss_kb", "read_bytes", "write_bytes", "returncode", "sample_count"]
+
+
+class ideas1_job_telemetry():
+    """ This class samples the working jobs and their descendants from /proc every sample_interval
+        seconds, and keeps one record per finished job of a batch:
+
+        cpu_time     cpu seconds used by the job (from wait4 when available, exact)
+        cores_used   cpu_time / wall_time, the cpus the job really kept busy
+        cpu_efficiency   cores_used / cpu_requested, below 1 the job asked for too many cpus
+        peak_rss_kb  largest resident memory of the job and its descendants seen at its start and
+                     in the samples, read_bytes / write_bytes from storage
+
+        For a job reaped with wait4 the cpu time and io come from its resource usage. Its ru_maxrss
+        is not used: it is at least the memory of the scheduler the job was forked from. Otherwise
+        (pool workers) they come from the samples, which only see the descendants while they run or
+        once reaped by their parent. The records of a batch are written to csv_path and json_path
+        when it ends.
+    """
+    def __init__(self, sample_interval=1.0, csv_path=None, json_path=None):
+        self.sample_interval = sample_interval
+        self.csv_path = csv_path
+        self.json_path = json_path
+        self.next_sample_time = None
+        self.working_job_dict = {}
+        self.record_list = []
+
+    def start(self):
+        self.working_job_dict = {}
+        self.record_list = []
+        self.next_sample_time = time.time() + self.sample_interval
+
+    def start_job(self, i, pid, command, cpu_requested):
+        # The baseline is not 0 for a process reused from job to job (a pool worker)
+        usage_dict = get_process_tree_usage(pid, {}) if pid is not None else None
+        self.working_job_dict[i] = {"pid": pid, "command": command, "cpu_requested": cpu_requested,
+                                    "baseline": usage_dict, "last": usage_dict,
+                                    "peak_rss_kb": usage_dict["rss_kb"] if usage_dict is not None else None,
+                                    "sample_count": 0}
+
+    def sample(self):
+        child_pid_dict = get_child_pid_dict()
+        for job_dict in self.working_job_dict.values():
+            if job_dict["pid"] is not None:
+                self.sample_job(job_dict, child_pid_dict)
+        self.next_sample_time = time.time() + self.sample_interval
+
+    @staticmethod
+    def sample_job(job_dict, child_pid_dict):
+        usage_dict = get_process_tree_usage(job_dict["pid"], child_pid_dict)
+        job_dict["sample_count"] += 1
+        job_dict["peak_rss_kb"] = max(job_dict["peak_rss_kb"] or 0, usage_dict["rss_kb"])
+        # A descendant exiting unreaped drops out of the sums, keep the largest values seen
+        job_dict["last"] = {name: max(value, job_dict["last"][name]) for name, value in usage_dict.items()}
+
+    def finish_job(self, i, returncode, wall_time, rusage=None):
+        """ Record the finished job i and return its record. """
+        job_dict = self.working_job_dict.pop(i)
+        if rusage is None and job_dict["pid"] is not None:
+            # Not a reaped child, such as a pool worker going on with other jobs: it can still be read
+            self.sample_job(job_dict, {})
+        cpu_time = None
+        read_bytes = write_bytes = None
+        if job_dict["sample_count"]:
+            cpu_time = job_dict["last"]["cpu_time"] - job_dict["baseline"]["cpu_time"]
+            read_bytes = job_dict["last"]["read_bytes"] - job_dict["baseline"]["read_bytes"]
+            write_bytes = job_dict["last"]["write_bytes"] - job_dict["baseline"]["write_bytes"]
+        peak_rss_kb = job_dict["peak_rss_kb"]
+        if rusage is not None:
+            # Exact totals of the job and the descendants it reaped, blocks are 512 bytes
+            cpu_time = rusage.ru_utime + rusage.ru_stime
+            read_bytes = max(read_bytes or 0, rusage.ru_inblock * 512)
+            write_bytes = max(write_bytes or 0, rusage.ru_oublock * 512)
+        cores_used = None if cpu_time is None or wall_time <= 0 else cpu_time / wall_time
+        self.record_list.append({"job": i + 1,
+                                 "command": job_dict["command"],
+                                 "cpu_requested": job_dict["cpu_requested"],
+                                 "cores_used": cores_used,
+                                 "cpu_efficiency": (cores_used / job_dict["cpu_requested"]
+                                                    if cores_used is not None and job_dict["cpu_requested"] > 0 else None),
+                                 "wall_time": wall_time,
+                                 "cpu_time": cpu_time,
+                                 "peak_rss_kb": peak_rss_kb,
+                                 "read_bytes": read_bytes,
+                                 "write_bytes": write_bytes,
+                                 "returncode": returncode,
+                                 "sample_count": job_dict["sample_count"]})
+        return self.record_list[-1]
+
+    def write_csv(self, csv_path):
+        with open(csv_path, 'w', newline='') as csv_file:
+            writer = csv.DictWriter(csv_file, fieldnames=TELEMETRY_FIELD_LIST)
+            writer.writeheader()
+            writer.writerows(self.record_list)
+
+    def write_json(self, json_path):
+        with open(json_path, 'w') as json_file:
+            json.dump(self.record_list, json_file, indent=1)
+
+    def finish(self):
+        """ Write the records and print the jobs asking for a cpu count far from what they used. """
+        if self.csv_path is not None:
+            self.write_csv(self.csv_path)
+        if self.json_path is not None:
+            self.write_json(self.json_path)
+        for record in self.record_list:
+            if record["cpu_efficiency"] is None or record["wall_time"] < self.sample_interval:
+                continue
+            if record["cpu_efficiency"] < 0.5:
+                print("<?> Job {0} kept {1:.1f} of its {2} cpus busy: {3}".format(
+                    record["job"], record["cores_used"], record["cpu_requested"], record["command"]))
+            elif record["cpu_efficiency"] > 1.5:
+                print("<?> Job {0} kept {1:.1f} cpus busy, more than its {2}: {3}".format(
+                    record["job"], record["cores_used"], record["cpu_requested"], record["command"]))
@@ -1,16 +1,211 @@
 #!/usr/bin/python -3.6
 # ‐*‐ coding: utf‐8 ‐*‐
 
+import base64
+import collections
+import heapq
+import itertools
 import json
+import math
 import os
-import numpy as np
+import queue
+import selectors
+import shutil
+import signal
 import subprocess
 import shlex
+import statistics
+import sys
+import tempfile
+import threading
 import time
-import matplotlib
-matplotlib.use('agg')
-import matplotlib.pyplot as plt
-import matplotlib.gridspec as gridspec
+from ideas1_journal import ideas1_reattached_process
+from ideas1_placement import ideas1_core_placement
+from ideas1_proc import read_meminfo, get_child_pid_dict, get_process_tree_rss_kb
+from ideas1_scheduling import ideas1_critical_path_policy, ideas1_fifo_policy, estimate_makespan, is_fitting
+
+BATCH_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ideas1_batch.py")
+STATUS_SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ideas1_status.py")
+# Finished jobs needed before their median wall time is expected from the jobs without an estimate,
+# and the number of the last ones it is taken from
+SPECULATION_PEER_NUMBER = 3
+SPECULATION_PEER_WINDOW = 1024
+# Seconds a batch gets on top of the grace period, to take down its job after the same grace period
+BATCH_KILL_MARGIN = 2.0
+# SIGKILL, None where there is none (Windows): the jobs are then killed with process.kill()
+KILL_SIGNAL = getattr(signal, "SIGKILL", None)
+
+
+def signal_process_group(process, sig):
+    """ Send sig to the process group the job leads, or to the job alone when it leads none or
+        there are no process groups (Windows): SIGTERM terminates it, KILL_SIGNAL kills it.
+    """
+    if process.pid is not None and sig is not None and hasattr(os, "killpg"):
+        try:
+            if os.getpgid(process.pid) == process.pid:
+                os.killpg(process.pid, sig)
+                return
+        except ProcessLookupError:
+            return
+    if sig == signal.SIGTERM and hasattr(process, "send_signal"):
+        process.send_signal(sig)
+    else:
+        process.kill()
+
+
+def terminate_process_group(process, kill_grace_period):
+    """ Send SIGTERM to the job, then SIGKILL kill_grace_period seconds later if it has not exited
+        (its returncode is still None), as the runner does on timeout. For the jobs run outside of
+        a runner, by ideas1_batch and the worker agents. Return the timer of the SIGKILL.
+    """
+    def kill():
+        if process.returncode is None:
+            signal_process_group(process, KILL_SIGNAL)
+    signal_process_group(process, signal.SIGTERM)
+    timer = threading.Timer(kill_grace_period, kill)
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+class ideas1_exit_watcher():
+    """ This class blocks until one of the registered processes exits or a timeout expires.
+
+        On Linux every process gets a pidfd registered in a selector, so waiting is a
+        single select() call. Elsewhere a helper thread per process blocks in wait()
+        and reports the exit through a queue. Where os.wait4 exists the exited process
+        is reaped with it, so its resource usage (peak memory ...) is returned as well.
+    """
+    def __init__(self):
+        self.use_pidfd = self.is_pidfd_supported()
+        self.selector = selectors.DefaultSelector() if self.use_pidfd else None
+        self.exit_queue = queue.Queue()
+        self.wake_fd_list = None
+        if self.use_pidfd:
+            # Written by wake() from other threads, registered with None in place of a process
+            self.wake_fd_list = os.pipe()
+            os.set_blocking(self.wake_fd_list[1], False)
+            self.selector.register(self.wake_fd_list[0], selectors.EVENT_READ, None)
+
+    @staticmethod
+    def is_pidfd_supported():
+        if not hasattr(os, "pidfd_open"):
+            return False
+        try:
+            os.close(os.pidfd_open(os.getpid()))
+        except OSError:
+            # The kernel is older than 5.3
+            return False
+        return True
+
+    def register(self, process):
+        if self.use_pidfd:
+            self.selector.register(os.pidfd_open(process.pid), selectors.EVENT_READ, process)
+        else:
+            threading.Thread(target=self.wait_in_thread, args=(process,), daemon=True).start()
+
+    @staticmethod
+    def reap(process):
+        """ Wait for the process and return its resource usage, None if it is not available. """
+        if not hasattr(os, "wait4"):
+            process.wait()
+            return None
+        try:
+            _, status, rusage = os.wait4(process.pid, 0)
+        except ChildProcessError:
+            # Already reaped by the subprocess module
+            process.wait()
+            return None
+        if os.WIFSIGNALED(status):
+            process.returncode = -os.WTERMSIG(status)
+        else:
+            process.returncode = os.WEXITSTATUS(status)
+        return rusage
+
+    def wait_in_thread(self, process):
+        self.exit_queue.put((process, self.reap(process)))
+
+    def wake(self):
+        """ Make the current or next wait() return, from any thread. """
+        if self.use_pidfd:
+            try:
+                os.write(self.wake_fd_list[1], b"\0")
+            except BlockingIOError:
+                # Already woken
+                pass
+        else:
+            self.exit_queue.put((None, None))
+
+    def wait(self, timeout=None):
+        """ Return (process, rusage) for the processes that exited, or an empty list once the timeout expires. """
+        if timeout is not None:
+            timeout = max(timeout, 0)
+        finished_list = []
+        if self.use_pidfd:
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    os.read(key.fileobj, 65536)
+                    continue
+                self.selector.unregister(key.fileobj)
+                os.close(key.fileobj)
+                finished_list.append((key.data, self.reap(key.data)))
+        else:
+            try:
+                finished_list.append(self.exit_queue.get(timeout=timeout))
+                while True:
+                    finished_list.append(self.exit_queue.get_nowait())
+            except queue.Empty:
+                pass
+        return [(process, rusage) for process, rusage in finished_list if process is not None]
+
+    def close(self):
+        if self.selector is not None:
+            for key in list(self.selector.get_map().values()):
+                self.selector.unregister(key.fileobj)
+                os.close(key.fileobj)
+            self.selector.close()
+            os.close(self.wake_fd_list[1])
+
+
+class ideas1_stream_capture():
+    """ This class drains the stdout and stderr pipes of one process while it runs.
+        Everything read is written to the optional log files, and only the last tail_size
+        bytes of each stream are kept in memory, so the job never blocks on a full pipe.
+    """
+    def __init__(self, process, stdout_path=None, stderr_path=None, tail_size=65536):
+        self.tail_size = tail_size
+        self.stdout_path = stdout_path
+        self.stderr_path = stderr_path
+        self.tail_list = [collections.deque(), collections.deque()]
+        self.thread_list = []
+        for pipe, path, tail in zip((process.stdout, process.stderr), (stdout_path, stderr_path), self.tail_list):
+            thread = threading.Thread(target=self.drain, args=(pipe, path, tail), daemon=True)
+            thread.start()
+            self.thread_list.append(thread)
+
+    def drain(self, pipe, path, tail):
+        log_file = open(path, 'wb') if path is not None else None
+        tail_size = 0
+        try:
+            for chunk in iter(lambda: pipe.read1(65536), b""):
+                if log_file is not None:
+                    log_file.write(chunk)
+                tail.append(chunk)
+                tail_size += len(chunk)
+                while len(tail) > 1 and tail_size - len(tail[0]) >= self.tail_size:
+                    tail_size -= len(tail.popleft())
+        finally:
+            pipe.close()
+            if log_file is not None:
+                log_file.close()
+
+    def join(self):
+        """ Wait for both pipes to be closed and return the (stdout, stderr) tails. """
+        for thread in self.thread_list:
+            thread.join()
+        if self.tail_size <= 0:
+            return b"", b""
+        return tuple(b"".join(tail)[-self.tail_size:] for tail in self.tail_list)
 
 
 class ideas1_multiple_processing():
@@ -27,27 +222,139 @@ class ideas1_multiple_processing():
                                 3,
                                 2,
                                 1]
+
+        The order in which the jobs are launched is decided by scheduling_policy, one of the
+        policies in ideas1_scheduling. The default ideas1_fifo_policy keeps the given order,
+        ideas1_backfill_policy([3600, 7200, 1800, 600]) lets the short jobs use the cpus left
+        idle while a large job waits.
+
+        With history, an ideas1_history.ideas1_runtime_history, every finished job is recorded
+        and the runtimes of the new jobs are predicted from the previous runs. The predictions
+        drive ideas1_longest_first_policy and ideas1_backfill_policy, and estimate_makespan().
+
+        With input_memory_usage_list (MB per job, 0 for the missing ones) or memory_provided (MB,
+        MemAvailable of /proc/meminfo by default) a job starts only when both its cpus and its
+        memory are free. The resident memory of the working jobs and their children is sampled
+        every memory_sample_interval seconds, and a job using more than it asked for is counted
+        with its real usage, which holds back the new launches.
+
+        With result_cache, an ideas1_cache.ideas1_result_cache, a job identical to one that already
+        succeeded (same argv, environment subset and contents of its input_file_list entry) is not
+        run again: its stored outputs are logged instead. A job identical to a working one waits
+        for its result.
+
+        With journal, an ideas1_journal.ideas1_job_journal, every job state change is written ahead
+        to disk. A runner restarted on the same journal skips the jobs already done, takes back the
+        cpus of the jobs still running from the previous runner and only launches the others. The
+        exit status of a reattached job cannot be read, so it is run again once it is gone.
+
+        With input_dependency_list, the indices in input_job_list of the jobs each job depends on,
+        a job is queued only once all its parents have succeeded, and is skipped when one of them
+        failed. The default policy is then ideas1_critical_path_policy. Input example:
+
+        input_dependency_list = [[],
+                                 [0],
+                                 [0],
+                                 [1, 2]]
+
+        input_runtime_list declares the runtimes of the jobs in seconds (None for the unknown ones),
+        used in place of the predictions of history.
+
+        With telemetry, an ideas1_telemetry.ideas1_job_telemetry, the working jobs are sampled from
+        /proc and the cpu time, cpus really used, peak memory and io of every job are exported
+        when the batch ends, to compare with the cpus the jobs asked for.
+
+        With cpu_controller, an ideas1_concurrency.ideas1_adaptive_cpu_budget, cpu_provided follows
+        the load of the machine during the run, between the floor and the ceiling of the controller,
+        and is the ceiling after it.
     """
-    def __init__(self, cpu_provided, input_job_list, input_cpu_usage_list=None, env=None):
+    # Whether a straggler can be run a second time with launch_job_copy
+    is_speculation_supported = True
+
+    def __init__(self, cpu_provided, input_job_list, input_cpu_usage_list=None, env=None, scheduling_policy=None,
+                 history=None, input_memory_usage_list=None, memory_provided=None, memory_sample_interval=1.0,
+                 result_cache=None, input_file_list=None, journal=None, input_dependency_list=None,
+                 input_runtime_list=None, telemetry=None, cpu_controller=None):
         super().__init__()
         self.cpu_used = 0
         self.cpu_provided = cpu_provided
         self.input_job_list = input_job_list
         self.env = env
+        self.input_dependency_list = input_dependency_list
+        if scheduling_policy is None:
+            scheduling_policy = ideas1_critical_path_policy() if input_dependency_list is not None else ideas1_fifo_policy()
+        self.scheduling_policy = scheduling_policy
+        self.history = history
+        self.input_runtime_list = input_runtime_list
+        self.estimated_runtime_list = None
+        self.result_cache = result_cache
+        self.input_file_list = input_file_list if input_file_list is not None else []
+        self.job_cache_key_dict = {}
+        self.cache_leader_dict = {}
+        self.cache_follower_dict = {}
+        self.journal = journal
+        self.telemetry = telemetry
+        self.cpu_controller = cpu_controller
         self.job_list = []
         self.input_cpu_usage_list = input_cpu_usage_list
         self.cpu_usage_list = []
+        self.input_memory_usage_list = input_memory_usage_list
+        self.memory_usage_list = []
+        self.memory_provided = memory_provided
+        self.memory_sample_interval = memory_sample_interval
+        self.memory_sample_time = None
+        self.is_memory_over_plan = False
+        self.queued_job_index_list = []
         self.working_job_list = []
-        self.working_job_end_time_list = []
+        self.working_job_index_list = []
+        self.working_job_start_time_list = []
         self.working_job_cpu_usage_list = []
+        self.working_job_memory_usage_list = []
+        self.working_job_rss_list = []
+        # Peak resident memory (KB) of every working job, sampled for the history when there is no telemetry
+        self.working_job_peak_rss_list = []
+        self.working_job_capture_list = []
+        self.working_job_core_list = []
+        self.working_job_timeline_list = []
 
         self.finished_job_list = []
+        self.job_returncode_dict = {}
+        self.dependency_list = []
+        self.child_job_list = []
+        self.topological_order_list = []
+        self.pending_parent_count_list = []
+        self.skipped_job_set = set()
+
+        self.timeout = None
+        self.kill_grace_period = 10.0
+        self.deadline_heap = []
+        self.deadline_count = 0
+        self.stream_output = False
+        self.job_log_dir = None
+        self.output_tail_size = 65536
+        self.log_file = None
+        self.watcher = None
+        self.core_placement = None
+        self.launched_job_count = 0
+        self.batch_runtime = None
+        self.batch_job_dict = {}
+        self.speculation_factor = None
+        self.speculative_job_dict = {}
+        self.copy_process_set = set()
+        self.discarded_process_set = set()
+        self.finished_wall_time_list = collections.deque(maxlen=SPECULATION_PEER_WINDOW)
+        self.timeline_list = []
+        self.timeline_start_time = None
+        self.free_slot_list = []
+        self.slot_number = 0
 
         self.init_command_line_list()
         self.init_cpu_usage_list()
+        self.init_memory_usage_list()
+        self.init_dependency_list()
 
     def init_command_line_list(self):
-        if np.less(len(self.input_job_list), 1):
+        if len(self.input_job_list) < 1:
             print("<?> The job_list is empty!")
             return
         else:
@@ -57,12 +364,12 @@ class ideas1_multiple_processing():
                 self.job_list.append(shlex.split(job_i))
 
     def init_cpu_usage_list(self):
-        if np.less(len(self.input_job_list), 1):
+        if len(self.input_job_list) < 1:
             return
         else:
             if self.input_cpu_usage_list is None:
                 self.cpu_usage_list = [1 for _ in range(len(self.job_list))]
-            elif np.less_equal(len(self.input_cpu_usage_list), len(self.job_list)):
+            elif len(self.input_cpu_usage_list) <= len(self.job_list):
                 self.cpu_usage_list = [1 for _ in range(len(self.job_list))]
                 for i in range(len(self.input_cpu_usage_list)):
                     self.cpu_usage_list[i] = self.input_cpu_usage_list[i]
@@ -75,74 +382,993 @@ class ideas1_multiple_processing():
             # for cpu_usage_i in self.cpu_usage_list:
             #     print("    |  " + str(cpu_usage_i))
 
-            self.cpu_usage_max = np.max(self.cpu_usage_list)
-            if np.less(self.cpu_provided, self.cpu_usage_max):
+            self.cpu_usage_max = max(self.cpu_usage_list)
+            if self.cpu_provided < self.cpu_usage_max:
                 print("<?> The number of available cpus is less than the max usage of one job!")
 
+    def init_memory_usage_list(self):
+        self.memory_usage_list = [0 for _ in range(len(self.job_list))]
+        if self.input_memory_usage_list is None and self.memory_provided is None:
+            return
+        for i in range(min(len(self.job_list), len(self.input_memory_usage_list or []))):
+            self.memory_usage_list[i] = self.input_memory_usage_list[i]
+        if self.memory_provided is None:
+            meminfo_dict = read_meminfo()
+            if "MemAvailable" not in meminfo_dict:
+                print("<?> The available memory cannot be read from /proc/meminfo, memory is not checked!")
+                return
+            self.memory_provided = meminfo_dict["MemAvailable"] / 1024.0
+        print("    The available memory is: {:.0f} MB".format(self.memory_provided))
+        if self.memory_usage_list and self.memory_provided < max(self.memory_usage_list):
+            print("<?> The available memory is less than the max usage of one job!")
+
+    def add_job(self, command, cpu_usage=1, memory_usage=0):
+        """ Add a job without dependencies after the constructor and return its index, for the
+            caller to queue it.
+        """
+        # Read first: a command shlex cannot split, such as one with an unbalanced quote, is
+        # refused before any job list grows
+        job = shlex.split(command)
+        i = len(self.job_list)
+        self.input_job_list.append(command)
+        self.job_list.append(job)
+        self.cpu_usage_list.append(cpu_usage)
+        self.memory_usage_list.append(memory_usage)
+        self.dependency_list.append([])
+        self.child_job_list.append([])
+        # Predicted again with the new job
+        self.estimated_runtime_list = None
+        return i
+
+    def fill_queue(self):
+        """ Queue the jobs produced while the batch runs, called before every launch, see ideas1_sweep. """
+        pass
+
+    def init_dependency_list(self):
+        self.dependency_list = [[] for _ in range(len(self.job_list))]
+        self.child_job_list = [[] for _ in range(len(self.job_list))]
+        for i in range(min(len(self.job_list), len(self.input_dependency_list or []))):
+            for parent in self.input_dependency_list[i] or []:
+                if not 0 <= parent < len(self.job_list) or parent == i:
+                    raise ValueError("<?> Job {0} depends on job {1}, which is not another job!".format(i + 1, parent + 1))
+                self.dependency_list[i].append(parent)
+                self.child_job_list[parent].append(i)
+        self.topological_order_list = self.get_topological_order()
+
+    def get_topological_order(self, order_list=None):
+        """ Return the job indices with every job after its parents, otherwise in the order of
+            order_list (by default the given order).
+        """
+        if order_list is None:
+            order_list = list(range(len(self.job_list)))
+        position_list = [0 for _ in range(len(self.job_list))]
+        for k, i in enumerate(order_list):
+            position_list[i] = k
+        parent_count_list = [len(parent_list) for parent_list in self.dependency_list]
+        ready_heap = [(position_list[i], i) for i in range(len(self.job_list)) if parent_count_list[i] == 0]
+        heapq.heapify(ready_heap)
+        topological_order_list = []
+        while ready_heap:
+            _, i = heapq.heappop(ready_heap)
+            topological_order_list.append(i)
+            for child in self.child_job_list[i]:
+                parent_count_list[child] -= 1
+                if parent_count_list[child] == 0:
+                    heapq.heappush(ready_heap, (position_list[child], child))
+        if len(topological_order_list) < len(self.job_list):
+            raise ValueError("<?> The job dependencies contain a cycle!")
+        return topological_order_list
+
+    def init_dependency_state(self):
+        """ Keep in the queue only the jobs whose parents have all succeeded, and skip the jobs
+            depending on a failed job, accounting for the jobs done by a previous runner.
+        """
+        if self.input_dependency_list is None:
+            return
+        self.pending_parent_count_list = [sum(1 for parent in parent_list if self.job_returncode_dict.get(parent) != 0)
+                                          for parent_list in self.dependency_list]
+        for i in self.topological_order_list:
+            if i in self.job_returncode_dict and self.job_returncode_dict[i] != 0:
+                self.skip_dependent_jobs(i)
+        self.queued_job_index_list = [i for i in self.queued_job_index_list
+                                      if self.pending_parent_count_list[i] == 0 and i not in self.skipped_job_set]
+
+    def release_dependent_jobs(self, i, returncode):
+        """ Queue the children of a finished job which have no other parent left to wait for. """
+        self.job_returncode_dict[i] = returncode
+        if self.input_dependency_list is None:
+            return
+        if returncode != 0:
+            self.skip_dependent_jobs(i)
+            return
+        ready_job_list = []
+        for child in self.child_job_list[i]:
+            self.pending_parent_count_list[child] -= 1
+            if self.pending_parent_count_list[child] == 0 and child not in self.job_returncode_dict:
+                ready_job_list.append(child)
+        if ready_job_list:
+            self.queued_job_index_list = self.scheduling_policy.sort_queue(self, self.queued_job_index_list +
+                                                                           ready_job_list)
+
+    def skip_dependent_jobs(self, i):
+        child_job_list = list(self.child_job_list[i])
+        while child_job_list:
+            child = child_job_list.pop()
+            if child in self.skipped_job_set or child in self.job_returncode_dict:
+                continue
+            self.skipped_job_set.add(child)
+            print("<?> Skip job: {0}, job {1} it depends on failed!".format(self.input_job_list[child], i + 1))
+            child_job_list.extend(self.child_job_list[child])
+
     def log_process_output(self,
                            process,
-                           log_file):
-        outs, errs = process.communicate()
+                           log_file,
+                           capture=None,
+                           is_timeout=False,
+                           args=None):
+        # args, when the job was started through a wrapper
+        if args is None:
+            args = process.args
+        if capture is None:
+            outs, errs = process.communicate()
+            self.write_process_output(args, outs, errs, process.poll(), log_file, is_timeout=is_timeout)
+        else:
+            outs, errs = capture.join()
+            self.write_process_output(args, outs, errs, process.poll(), log_file,
+                                      output_path_list=[capture.stdout_path, capture.stderr_path],
+                                      is_timeout=is_timeout)
+        return outs, errs
+
+    def write_process_output(self,
+                             args,
+                             outs,
+                             errs,
+                             returncode,
+                             log_file,
+                             output_path_list=None,
+                             is_timeout=False):
+        if output_path_list is not None and output_path_list[0] is not None:
+            # Only the tails are kept in memory, point to the files holding the full outputs
+            outs = "<...> Full outputs in: {0}, {1}\n".format(*output_path_list).encode("utf-8") + outs
         if log_file is not None:
-            log_file.write("\n==> Subprocess: \n" + str(process.args))
-            log_file.write("\n--> Outputs: \n" + outs.decode("utf-8"))
-            if process.poll() != -9:
-                log_file.write("\n--> Errors: {}\n".format(len(errs)) + errs.decode("utf-8") + "\n")
+            log_file.write("\n==> Subprocess: \n" + str(args))
+            log_file.write("\n--> Outputs: \n" + outs.decode("utf-8", "replace"))
+            if not is_timeout and returncode != -9:
+                log_file.write("\n--> Errors: {}\n".format(len(errs)) + errs.decode("utf-8", "replace") + "\n")
             else:
                 log_file.write("\n--> Errors: Timeout\n\n")
         else:
-            print("\n==> Subprocess: \n" + str(process.args))
-            print("\n--> Outputs: \n" + outs.decode("utf-8"))
-            if process.poll() != -9:
-                print("\n--> Errors: {}\n".format(len(errs)) + errs.decode("utf-8") + "\n")
+            print("\n==> Subprocess: \n" + str(args))
+            print("\n--> Outputs: \n" + outs.decode("utf-8", "replace"))
+            if not is_timeout and returncode != -9:
+                print("\n--> Errors: {}\n".format(len(errs)) + errs.decode("utf-8", "replace") + "\n")
             else:
                 print("\n--> Errors: Timeout\n\n")
 
+    def get_job_cpu_usage(self, i):
+        """ A job asking for more than cpu_provided takes all of them and runs alone. """
+        return min(self.cpu_usage_list[i], self.cpu_provided)
+
+    def get_job_memory_usage(self, i):
+        """ A job asking for more than memory_provided takes all of it, 0 when memory is not checked. """
+        if self.memory_provided is None:
+            return 0
+        return min(self.memory_usage_list[i], self.memory_provided)
+
+    def get_job_resource_list(self, i):
+        return [self.get_job_cpu_usage(i), self.get_job_memory_usage(i)]
+
+    def get_free_resource_list(self):
+        if self.memory_provided is None:
+            return [self.cpu_provided - self.cpu_used, float("inf")]
+        memory_used = sum(max(memory_usage, rss) for memory_usage, rss in zip(self.working_job_memory_usage_list,
+                                                                               self.working_job_rss_list))
+        return [self.cpu_provided - self.cpu_used, self.memory_provided - memory_used]
+
+    def sample_memory_usage(self):
+        """ Read the resident memory (MB) of every working job, its children included, and keep
+            its peak for the history.
+        """
+        child_pid_dict = get_child_pid_dict()
+        for j in range(len(self.working_job_list)):
+            if self.working_job_list[j].pid is None:
+                continue
+            rss_kb = get_process_tree_rss_kb(self.working_job_list[j].pid, child_pid_dict)
+            self.working_job_rss_list[j] = rss_kb / 1024.0
+            if self.working_job_peak_rss_list[j] is not None:
+                self.working_job_peak_rss_list[j] = max(self.working_job_peak_rss_list[j], rss_kb)
+        self.memory_sample_time = time.time() + self.memory_sample_interval
+        if self.memory_provided is None:
+            # Only sampled for the history
+            return
+        is_memory_over_plan = sum(self.working_job_rss_list) > sum(self.working_job_memory_usage_list)
+        if is_memory_over_plan and not self.is_memory_over_plan:
+            print("<?> The jobs use {0:.0f} MB, more than the {1:.0f} MB planned, new jobs are held back!".format(
+                sum(self.working_job_rss_list), sum(self.working_job_memory_usage_list)))
+        self.is_memory_over_plan = is_memory_over_plan
+
+    def get_estimated_runtime(self, i):
+        if self.history is None and self.input_runtime_list is None:
+            return None
+        if self.estimated_runtime_list is None:
+            self.estimated_runtime_list = [None for _ in range(len(self.job_list))]
+            for k in range(len(self.job_list)):
+                if k < len(self.input_runtime_list or []) and self.input_runtime_list[k] is not None:
+                    self.estimated_runtime_list[k] = self.input_runtime_list[k]
+                elif self.history is not None:
+                    self.estimated_runtime_list[k] = self.history.predict_runtime(self.job_list[k])
+        return self.estimated_runtime_list[i]
+
+    def estimate_makespan(self, cpu_provided=None):
+        """ Return the predicted duration of the batch on cpu_provided cpus and the number of jobs
+            without a prediction, which are counted with the median of the predicted runtimes.
+        """
+        if cpu_provided is None:
+            cpu_provided = self.cpu_provided
+        runtime_list = [self.get_estimated_runtime(i) for i in range(len(self.job_list))]
+        known_runtime_list = [runtime for runtime in runtime_list if runtime is not None]
+        if not known_runtime_list:
+            return None, len(runtime_list)
+        default_runtime = statistics.median(known_runtime_list)
+        queued_job_index_list = self.scheduling_policy.sort_queue(self, list(range(len(self.job_list))))
+        parent_list = None
+        if self.input_dependency_list is not None:
+            queued_job_index_list = self.get_topological_order(queued_job_index_list)
+            position_list = [0 for _ in range(len(self.job_list))]
+            for k, i in enumerate(queued_job_index_list):
+                position_list[i] = k
+            parent_list = [[position_list[parent] for parent in self.dependency_list[i]] for i in queued_job_index_list]
+        makespan = estimate_makespan([default_runtime if runtime_list[i] is None else runtime_list[i]
+                                      for i in queued_job_index_list],
+                                     [self.cpu_usage_list[i] for i in queued_job_index_list],
+                                     cpu_provided, parent_list)
+        return makespan, len(runtime_list) - len(known_runtime_list)
+
+    def get_job_log_path_list(self, i):
+        if self.job_log_dir is None:
+            return [None, None]
+        return [os.path.join(self.job_log_dir, "job_{}.stdout.log".format(i+1)),
+                os.path.join(self.job_log_dir, "job_{}.stderr.log".format(i+1))]
+
+    def launch_job(self, i):
+        batch_job_list = self.take_batch_job_list(i)
+        if len(batch_job_list) > 1:
+            self.launch_batch(batch_job_list)
+            return
+        self.launched_job_count += 1
+        print("    |  ({0}/{1}) Run job: {2}".format(self.launched_job_count, len(self.job_list), self.input_job_list[i]))
+        # print("    |  The number of used cpus: {}".format(self.cpu_used))
+        # print("    |  The number of available cpus: {}".format(self.cpu_provided-self.cpu_used))
+        command = self.job_list[i]
+        status_path = None
+        if self.journal is not None:
+            # Run by ideas1_status, which keeps the exit status for a runner restarted meanwhile
+            status_path = self.journal.prepare_status_path(i)
+            command = [sys.executable, "-S", STATUS_SCRIPT_PATH, status_path] + command
+        # In a session of its own, so a timeout reaches all the processes the job started
+        try:
+            process = subprocess.Popen(command,
+                                       stdout=subprocess.PIPE,
+                                       stderr=subprocess.PIPE,
+                                       env=self.env,
+                                       start_new_session=True)
+        except OSError as error:
+            # Such as a missing executable: the job failed as in a shell, the other jobs go on
+            print("<?> Job {0} could not be started: {1}!".format(i + 1, error))
+            errs = str(error).encode("utf-8")
+            self.write_process_output(self.job_list[i], b"", errs, 127, self.log_file)
+            self.record_finished_job(i, 127, b"", errs, None, None, None)
+            return
+        if self.journal is not None:
+            self.journal.write_running(self.job_list, i, process.pid, status_path)
+        if self.stream_output:
+            capture = ideas1_stream_capture(process, *self.get_job_log_path_list(i), tail_size=self.output_tail_size)
+        else:
+            capture = None
+        self.add_working_job(i, process, capture, self.pin_job(process, i))
+
+    def is_batch_job(self, i):
+        estimated_runtime = self.get_estimated_runtime(i)
+        return estimated_runtime is not None and estimated_runtime < self.batch_runtime
+
+    def take_batch_job_list(self, i):
+        """ Take from the queue the short jobs to run together with job i, using the same resources,
+            as long as their estimated runtimes add up to at most batch_runtime. The short jobs are
+            shared out between the batches the free cpus can run at the same time, so a batch
+            takes at most its share of them.
+        """
+        if self.batch_runtime is None or not self.is_batch_job(i):
+            return [i]
+        candidate_job_list = [k for k in self.queued_job_index_list
+                              if self.is_batch_job(k) and self.get_job_resource_list(k) == self.get_job_resource_list(i)]
+        slot_number = max(int((self.cpu_provided - self.cpu_used) // max(self.get_job_cpu_usage(i), 1)), 1)
+        max_batch_size = math.ceil((len(candidate_job_list) + 1) / slot_number)
+        batch_runtime = self.get_estimated_runtime(i)
+        taken_job_list = []
+        for k in candidate_job_list:
+            if batch_runtime >= self.batch_runtime or len(taken_job_list) + 1 >= max_batch_size:
+                break
+            if batch_runtime + self.get_estimated_runtime(k) > self.batch_runtime:
+                continue
+            taken_job_list.append(k)
+            batch_runtime += self.get_estimated_runtime(k)
+        taken_job_set = set(taken_job_list)
+        self.queued_job_index_list = [k for k in self.queued_job_index_list if k not in taken_job_set]
+        batch_job_list = [i]
+        for k in taken_job_list:
+            if self.result_cache is None or not self.reuse_cached_result(k):
+                batch_job_list.append(k)
+        return batch_job_list
+
+    def launch_batch(self, batch_job_list):
+        """ Run the jobs one after the other in a single ideas1_batch.py process, counted as one
+            working job of the first one. The results are written to a temporary file, one line per job.
+        """
+        for k in batch_job_list:
+            self.launched_job_count += 1
+            print("    |  ({0}/{1}) Run job in a batch of {2}: {3}".format(self.launched_job_count, len(self.job_list),
+                                                                         len(batch_job_list), self.input_job_list[k]))
+        result_fd, result_path = tempfile.mkstemp(prefix="ideas1_batch_", suffix=".jsonl")
+        os.close(result_fd)
+        process = subprocess.Popen([sys.executable, "-S", BATCH_SCRIPT_PATH, result_path],
+                                   stdin=subprocess.PIPE,
+                                   env=self.env,
+                                   start_new_session=True)
+        batch_dict = {"job_list": [{"job": k, "command": self.job_list[k],
+                                    "stdout_path": self.get_job_log_path_list(k)[0],
+                                    "stderr_path": self.get_job_log_path_list(k)[1]} for k in batch_job_list],
+                      "timeout": self.timeout,
+                      "kill_grace_period": self.kill_grace_period,
+                      "tail_size": self.output_tail_size if self.stream_output else None}
+        process.stdin.write(json.dumps(batch_dict).encode("utf-8"))
+        process.stdin.close()
+        if self.journal is not None:
+            # The jobs of a lost batch are run again rather than reattached
+            for k in batch_job_list:
+                self.journal.write_running(self.job_list, k, None)
+        self.batch_job_dict[batch_job_list[0]] = (batch_job_list, result_path)
+        self.add_working_job(batch_job_list[0], process, None, self.pin_job(process, batch_job_list[0]))
+
+    def add_working_job(self, i, process, capture=None, core_list=None):
+        self.cpu_used += self.get_job_cpu_usage(i)
+        self.working_job_list.append(process)
+        self.working_job_index_list.append(i)
+        self.working_job_start_time_list.append(time.time())
+        self.working_job_cpu_usage_list.append(self.get_job_cpu_usage(i))
+        self.working_job_memory_usage_list.append(self.get_job_memory_usage(i))
+        self.working_job_rss_list.append(0)
+        # Sampled from the launch on, so a job done before the first sample still gets a peak
+        self.working_job_peak_rss_list.append(get_process_tree_rss_kb(process.pid, {})
+                                              if self.is_peak_memory_sampled and process.pid is not None else None)
+        self.working_job_capture_list.append(capture)
+        self.working_job_core_list.append(core_list)
+        label = self.get_working_job_label(i) + (" (copy)" if process in self.copy_process_set else "")
+        self.working_job_timeline_list.append({"job": i, "label": label,
+                                               "cpu_usage": self.get_job_cpu_usage(i),
+                                               "slot_list": self.allocate_slot_list(self.get_job_cpu_usage(i)),
+                                               "launch_time": time.time(), "kill_time": None,
+                                               "finish_time": None, "returncode": None})
+        self.timeline_list.append(self.working_job_timeline_list[-1])
+        if self.timeout is not None:
+            # A batch gets the timeout of each of its jobs
+            timeout = self.timeout * (len(self.batch_job_dict[i][0]) if i in self.batch_job_dict else 1)
+            self.push_deadline(time.time() + timeout, process, signal.SIGTERM)
+        self.watcher.register(process)
+        if self.telemetry is not None and process not in self.copy_process_set:
+            self.telemetry.start_job(i, process.pid, self.get_working_job_label(i), self.get_job_cpu_usage(i))
+
+    def get_working_job_label(self, i):
+        if i in self.batch_job_dict:
+            return "<batch of jobs {0}>".format(", ".join(str(k + 1) for k in self.batch_job_dict[i][0]))
+        return self.input_job_list[i]
+
+    def allocate_slot_list(self, cpu_usage):
+        """ Return the cpu slots shown for a job in the timeline, the lowest free ones. """
+        slot_list = []
+        for _ in range(max(math.ceil(cpu_usage), 1)):
+            if self.free_slot_list:
+                slot_list.append(heapq.heappop(self.free_slot_list))
+            else:
+                # Only when more cpus are used than provided, by the reattached jobs
+                slot_list.append(self.slot_number)
+                self.slot_number += 1
+        return slot_list
+
+    def resume_from_journal(self):
+        """ Drop the jobs already done from the queue and reattach the ones still running. """
+        state_dict = self.journal.load(self.job_list)
+        resumed_job_set = set()
+        for i in sorted(state_dict):
+            record = state_dict[i]
+            if record["state"] in ("finished", "failed"):
+                resumed_job_set.add(i)
+                self.finished_job_list.append(i)
+                self.job_returncode_dict[i] = record["returncode"]
+            elif record["state"] == "running" and self.journal.is_record_process_alive(record):
+                resumed_job_set.add(i)
+                self.launched_job_count += 1
+                print("    |  ({0}/{1}) Reattach job: {2}".format(self.launched_job_count, len(self.job_list),
+                                                                   self.input_job_list[i]))
+                self.add_working_job(i, ideas1_reattached_process(record["pid"], self.job_list[i],
+                                                                  record.get("status_path")))
+            elif record["state"] == "running" and self.journal.read_status(record.get("status_path")) is not None:
+                # Finished while no runner was there, its status file tells how
+                resumed_job_set.add(i)
+                self.finished_job_list.append(i)
+                self.job_returncode_dict[i] = self.journal.read_status(record["status_path"])
+                self.journal.write_done(self.job_list, i, self.job_returncode_dict[i])
+        self.queued_job_index_list = [i for i in self.queued_job_index_list if i not in resumed_job_set]
+        if state_dict:
+            print("    Resumed from the journal: {0} jobs done, {1} jobs reattached".format(
+                len(self.finished_job_list), len(self.working_job_list)))
+        self.journal.write_queued(self.job_list, [i for i in self.queued_job_index_list if i not in state_dict])
+
+    def pin_job(self, process, i):
+        """ Bind the job to its own cores, None when core pinning is off or no cores are left. """
+        if self.core_placement is None:
+            return None
+        core_list = self.core_placement.allocate(self.get_job_cpu_usage(i))
+        if core_list is None:
+            print("<?> Not enough free cores to pin job {}, it runs unpinned!".format(i+1))
+            return None
+        try:
+            # Set from here rather than in a preexec_fn, which is unsafe with the output threads running.
+            # The children started by the job afterwards inherit the affinity.
+            os.sched_setaffinity(process.pid, core_list)
+        except OSError:
+            # The job has already exited
+            pass
+        return core_list
+
+    def get_job_input_path_list(self, i):
+        if i < len(self.input_file_list) and self.input_file_list[i] is not None:
+            return self.input_file_list[i]
+        return []
+
+    def reuse_cached_result(self, i):
+        """ Log the cached outputs of the job, or park it behind an identical working job.
+            Return False when the job has to be run.
+        """
+        key = self.result_cache.get_job_key(self.job_list[i], self.env, self.get_job_input_path_list(i))
+        self.job_cache_key_dict[i] = key
+        if key in self.cache_leader_dict:
+            self.cache_follower_dict.setdefault(key, []).append(i)
+            return True
+        meta_dict = self.result_cache.load(key)
+        if meta_dict is None:
+            self.cache_leader_dict[key] = i
+            return False
+        del self.job_cache_key_dict[i]
+        self.launched_job_count += 1
+        print("    |  ({0}/{1}) Cached job: {2}".format(self.launched_job_count, len(self.job_list), self.input_job_list[i]))
+        output_list = []
+        for path in (meta_dict["stdout_path"], meta_dict["stderr_path"]):
+            with open(path, 'rb') as output_file:
+                if self.stream_output:
+                    # Only the tail is logged, as for a streamed job
+                    output_file.seek(max(os.path.getsize(path) - max(self.output_tail_size, 0), 0))
+                output_list.append(output_file.read())
+        output_path_list = None
+        if self.job_log_dir is not None:
+            output_path_list = self.get_job_log_path_list(i)
+            shutil.copyfile(meta_dict["stdout_path"], output_path_list[0])
+            shutil.copyfile(meta_dict["stderr_path"], output_path_list[1])
+        self.write_process_output(self.job_list[i], output_list[0], output_list[1], meta_dict["returncode"],
+                                  self.log_file, output_path_list)
+        self.finished_job_list.append(i)
+        if self.journal is not None:
+            self.journal.write_done(self.job_list, i, meta_dict["returncode"])
+        self.release_dependent_jobs(i, meta_dict["returncode"])
+        return True
+
+    def store_cached_result(self, i, returncode, outs, errs, output_path_list=None):
+        if i not in self.job_cache_key_dict:
+            # Reattached from the journal, not looked up in the cache and its outputs are lost
+            return
+        key = self.job_cache_key_dict.pop(i)
+        del self.cache_leader_dict[key]
+        if output_path_list is None:
+            self.result_cache.store(key, self.job_list[i], returncode, outs, errs)
+        elif output_path_list[0] is not None:
+            self.result_cache.store(key, self.job_list[i], returncode,
+                                    stdout_path=output_path_list[0], stderr_path=output_path_list[1])
+        # Streamed outputs without job log files are only tails, they are not cached.
+        # The parked identical jobs go back to the head of the queue, to be served from the cache
+        # or, if the job failed, to be run.
+        self.queued_job_index_list[:0] = self.cache_follower_dict.pop(key, [])
+
+    def can_launch_job(self, i):
+        """ Last check before launching a selected job, a job refused here stays queued. """
+        return True
+
+    def create_watcher(self):
+        return ideas1_exit_watcher()
+
+    def launch_selected_jobs(self):
+        is_selecting = True
+        while is_selecting:
+            # Jobs served from the cache use no resources, select again until every selected job runs
+            is_selecting = False
+            for i in self.scheduling_policy.select_job_list(self, self.queued_job_index_list, time.time()):
+                if i not in self.queued_job_index_list or not self.can_launch_job(i):
+                    # Served from the cache meanwhile, or refused
+                    continue
+                self.queued_job_index_list.remove(i)
+                if self.result_cache is not None and self.reuse_cached_result(i):
+                    is_selecting = True
+                    continue
+                self.launch_job(i)
+                if i in self.batch_job_dict:
+                    # The batch took queued jobs, maybe selected ones: select again for the cpus left
+                    is_selecting = True
+                    break
+
+    def finish_job(self, j, rusage=None):
+        process = self.working_job_list.pop(j)
+        process.wait()
+        wall_time = time.time() - self.working_job_start_time_list.pop(j)
+        capture = self.working_job_capture_list.pop(j)
+        self.cpu_used -= self.working_job_cpu_usage_list.pop(j)
+        self.working_job_memory_usage_list.pop(j)
+        self.working_job_rss_list.pop(j)
+        peak_rss_kb = self.working_job_peak_rss_list.pop(j)
+        i = self.working_job_index_list.pop(j)
+        core_list = self.working_job_core_list.pop(j)
+        if core_list is not None:
+            self.core_placement.release(core_list)
+        timeline_dict = self.working_job_timeline_list.pop(j)
+        timeline_dict["finish_time"] = time.time()
+        timeline_dict["returncode"] = process.returncode
+        for slot in timeline_dict["slot_list"]:
+            heapq.heappush(self.free_slot_list, slot)
+        telemetry_record = None
+        if self.telemetry is not None and process not in self.copy_process_set:
+            telemetry_record = self.telemetry.finish_job(i, process.returncode, wall_time, rusage)
+        if not getattr(process, "is_exit_status_known", True) and timeline_dict["kill_time"] is None:
+            # A reattached job may have failed, it is run again rather than counted as done
+            print("<?> The exit status of reattached job {0} is unknown, it is run again: {1}".format(
+                i + 1, self.input_job_list[i]))
+            if self.journal is not None:
+                self.journal.write_queued(self.job_list, [i])
+            self.queued_job_index_list[:0] = [i]
+            return
+        if process in self.discarded_process_set:
+            # The other copy of the job finished first
+            self.discard_job_copy(process, capture)
+            return
+        if i in self.speculative_job_dict:
+            self.keep_job_copy(i, process, capture)
+        if i in self.batch_job_dict:
+            self.finish_batch(i, process, timeline_dict["kill_time"] is not None)
+            return
+        outs, errs = self.log_process_output(process, self.log_file, capture, timeline_dict["kill_time"] is not None,
+                                             self.job_list[i])
+        # The peak memory sampled by the telemetry, or by the runner without it. Not ru_maxrss: the child
+        # starts as a copy of this process, so a job staying below the memory of the scheduler would
+        # get the scheduler memory
+        if telemetry_record is not None:
+            peak_rss_kb = telemetry_record["peak_rss_kb"]
+        self.record_finished_job(i, process.returncode, outs, errs,
+                                 None if capture is None else [capture.stdout_path, capture.stderr_path],
+                                 wall_time, peak_rss_kb)
+
+    def finish_batch(self, i, process, is_timeout=False):
+        """ Log and record every job of the batch started for job i, from the lines of its result file. """
+        batch_job_list, result_path = self.batch_job_dict.pop(i)
+        result_dict = {}
+        with open(result_path) as result_file:
+            for line in result_file:
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    # The last line may be cut if the batch was killed while writing it
+                    continue
+                result_dict[result["job"]] = result
+        os.remove(result_path)
+        for k in batch_job_list:
+            if k in result_dict:
+                returncode = result_dict[k]["returncode"]
+                outs, errs = [base64.b64decode(output) for output in result_dict[k]["outputs"]]
+                wall_time = result_dict[k]["wall_time"]
+                # The batch reports the jobs it took down on timeout
+                is_job_timeout = result_dict[k].get("is_timeout", returncode == -9)
+            else:
+                returncode = process.returncode
+                outs, errs = b"", b"<?> The batch exited before running the job\n"
+                wall_time = None
+                is_job_timeout = is_timeout
+            output_path_list = self.get_job_log_path_list(k) if self.stream_output else None
+            self.write_process_output(self.job_list[k], outs, errs, returncode, self.log_file, output_path_list,
+                                      is_job_timeout)
+            self.record_finished_job(k, returncode, outs, errs, output_path_list, wall_time, None)
+
+    def record_finished_job(self, i, returncode, outs, errs, output_path_list, wall_time, peak_memory_kb):
+        self.finished_job_list.append(i)
+        if self.speculation_factor is not None and returncode == 0 and wall_time is not None:
+            self.finished_wall_time_list.append(wall_time)
+        if self.journal is not None:
+            self.journal.write_done(self.job_list, i, returncode)
+        if self.result_cache is not None:
+            self.store_cached_result(i, returncode, outs, errs, output_path_list)
+        if self.history is not None and wall_time is not None:
+            self.history.record(self.job_list[i], self.cpu_usage_list[i], wall_time, returncode, peak_memory_kb)
+        self.release_dependent_jobs(i, returncode)
+
+    def get_expected_runtime(self, i):
+        """ Return the runtime expected for job i: its estimate, else the median wall time of the
+            last jobs finished in this run once there are SPECULATION_PEER_NUMBER of them, else None.
+        """
+        estimated_runtime = self.get_estimated_runtime(i)
+        if estimated_runtime is not None:
+            return estimated_runtime
+        if len(self.finished_wall_time_list) < SPECULATION_PEER_NUMBER:
+            return None
+        return statistics.median(self.finished_wall_time_list)
+
+    def get_straggler_list(self):
+        """ Return the times at which the working jobs become stragglers, with their positions in
+            the working lists, once no job is queued. Batches and jobs already copied are left out.
+        """
+        straggler_list = []
+        if self.speculation_factor is None or self.queued_job_index_list:
+            return straggler_list
+        for j, i in enumerate(self.working_job_index_list):
+            if (i in self.batch_job_dict or i in self.speculative_job_dict or self.working_job_list[j] in self.discarded_process_set
+                    or isinstance(self.working_job_list[j], ideas1_reattached_process)):
+                # The outputs of a reattached job are lost, it is not copied
+                continue
+            expected_runtime = self.get_expected_runtime(i)
+            if expected_runtime is not None:
+                straggler_list.append((self.working_job_start_time_list[j] + self.speculation_factor * expected_runtime, j))
+        return straggler_list
+
+    def launch_speculative_jobs(self):
+        """ Start a copy of every straggler fitting in the free resources, the longest late first. """
+        now = time.time()
+        for straggler_time, j in sorted(self.get_straggler_list()):
+            i = self.working_job_index_list[j]
+            if straggler_time <= now and is_fitting(self.get_job_resource_list(i), self.get_free_resource_list()):
+                print("    |  Run a copy of job {0}, running for {1:.1f} s against {2:.1f} s expected: {3}".format(
+                    i + 1, now - self.working_job_start_time_list[j], self.get_expected_runtime(i), self.input_job_list[i]))
+                self.launch_job_copy(i, self.working_job_list[j])
+
+    def launch_job_copy(self, i, process):
+        """ Run job i a second time next to its working process. """
+        process_copy = subprocess.Popen(self.job_list[i],
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.PIPE,
+                                        env=self.env,
+                                        start_new_session=True)
+        self.copy_process_set.add(process_copy)
+        self.speculative_job_dict[i] = [process, process_copy]
+        if self.stream_output:
+            capture = ideas1_stream_capture(process_copy,
+                                            *[None if path is None else path + ".copy" for path in self.get_job_log_path_list(i)],
+                                            tail_size=self.output_tail_size)
+        else:
+            capture = None
+        self.add_working_job(i, process_copy, capture, self.pin_job(process_copy, i))
+
+    def keep_job_copy(self, i, process, capture):
+        """ Kill the other copies of job i, the one of process finished first. """
+        for other_process in self.speculative_job_dict.pop(i):
+            if other_process is not process and other_process in self.working_job_list:
+                self.discarded_process_set.add(other_process)
+                self.working_job_timeline_list[self.working_job_list.index(other_process)]["kill_time"] = time.time()
+                self.signal_job(other_process, KILL_SIGNAL)
+        print("    |  The {0} of job {1} finished first, the other one is killed".format(
+            "copy" if process in self.copy_process_set else "original", i + 1))
+        if process in self.copy_process_set and capture is not None and capture.stdout_path is not None:
+            # Once the copy has closed its log files, they take the place of the ones of the original
+            capture.join()
+            copy_path_list = [capture.stdout_path, capture.stderr_path]
+            capture.stdout_path, capture.stderr_path = self.get_job_log_path_list(i)
+            os.replace(copy_path_list[0], capture.stdout_path)
+            os.replace(copy_path_list[1], capture.stderr_path)
+        self.copy_process_set.discard(process)
+
+    def discard_job_copy(self, process, capture):
+        """ Drop the outputs of a copy killed as the other one finished first. """
+        self.discarded_process_set.discard(process)
+        if capture is None:
+            process.communicate()
+        else:
+            capture.join()
+            if process in self.copy_process_set and capture.stdout_path is not None:
+                os.remove(capture.stdout_path)
+                os.remove(capture.stderr_path)
+        self.copy_process_set.discard(process)
+
+    def push_deadline(self, deadline, process, sig):
+        # The count keeps equal deadlines from comparing the processes
+        heapq.heappush(self.deadline_heap, (deadline, self.deadline_count, process, sig))
+        self.deadline_count += 1
+
+    @staticmethod
+    def signal_job(process, sig):
+        signal_process_group(process, sig)
+
+    def terminate_working_jobs(self):
+        """ Take down the jobs still working when the run stops early, on Ctrl-C or an error: they
+            run in sessions of their own, out of reach of the signals sent to the runner.
+        """
+        timer_list = [terminate_process_group(process, self.kill_grace_period) for process in self.working_job_list]
+        end_time = time.time() + self.kill_grace_period
+        while time.time() < end_time and any(process.poll() is None for process in self.working_job_list):
+            time.sleep(0.05)
+        for timer in timer_list:
+            timer.cancel()
+        for process in self.working_job_list:
+            if process.poll() is None:
+                self.signal_job(process, KILL_SIGNAL)
+
+    def terminate_job(self, process):
+        """ Send SIGTERM to a working job, and SIGKILL once the grace period is over if it is still there. """
+        if not hasattr(process, "send_signal"):
+            # Pool jobs can only be killed
+            self.signal_job(process, KILL_SIGNAL)
+            return
+        kill_grace_period = self.kill_grace_period
+        if self.working_job_index_list[self.working_job_list.index(process)] in self.batch_job_dict:
+            kill_grace_period += BATCH_KILL_MARGIN
+        self.push_deadline(time.time() + kill_grace_period, process, KILL_SIGNAL)
+        self.signal_job(process, signal.SIGTERM)
+
+    def expire_deadlines(self):
+        """ Terminate the jobs reaching their timeout, and kill the ones still there after the grace period. """
+        while self.deadline_heap and self.deadline_heap[0][0] <= time.time():
+            _, _, process, sig = heapq.heappop(self.deadline_heap)
+            if process not in self.working_job_list:
+                # Finished meanwhile
+                continue
+            j = self.working_job_list.index(process)
+            if sig == signal.SIGTERM:
+                self.working_job_timeline_list[j]["kill_time"] = time.time()
+                self.terminate_job(process)
+            else:
+                self.signal_job(process, KILL_SIGNAL)
+        if len(self.deadline_heap) > 2 * len(self.working_job_list) + 64:
+            # Most are left by finished jobs, drop them before they pile up over long batches
+            self.deadline_heap = [deadline for deadline in self.deadline_heap if deadline[2] in self.working_job_list]
+            heapq.heapify(self.deadline_heap)
+
+    def wait_for_working_jobs(self):
+        """ Sleep until a working job exits or the nearest deadline expires, then release its cpus. """
+        end_time_list = [self.deadline_heap[0][0]] if self.deadline_heap else []
+        if self.memory_sample_time is not None:
+            end_time_list.append(self.memory_sample_time)
+        if self.telemetry is not None:
+            end_time_list.append(self.telemetry.next_sample_time)
+        if self.cpu_controller is not None:
+            end_time_list.append(self.cpu_controller.next_sample_time)
+        now = time.time()
+        end_time_list.extend(straggler_time for straggler_time, _ in self.get_straggler_list() if straggler_time > now)
+        wait_time = min(end_time_list) - time.time() if end_time_list else None
+        for process, rusage in self.watcher.wait(wait_time):
+            self.finish_job(self.working_job_list.index(process), rusage)
+        if self.memory_sample_time is not None and self.memory_sample_time <= time.time():
+            self.sample_memory_usage()
+        if self.telemetry is not None and self.telemetry.next_sample_time <= time.time():
+            self.telemetry.sample()
+        if self.cpu_controller is not None and self.cpu_controller.next_sample_time <= time.time():
+            self.cpu_provided = self.cpu_controller.update(bool(self.queued_job_index_list))
+        # Signalled jobs are reaped by the watcher on a later call
+        self.expire_deadlines()
+
+    def get_cpu_utilisation_curve(self):
+        """ Return the times since the batch started at which the cpus in use change, and the
+            number of cpus in use from each of these times on.
+        """
+        event_list = []
+        for timeline_dict in self.timeline_list:
+            event_list.append((timeline_dict["launch_time"] - self.timeline_start_time, timeline_dict["cpu_usage"]))
+            if timeline_dict["finish_time"] is not None:
+                event_list.append((timeline_dict["finish_time"] - self.timeline_start_time, -timeline_dict["cpu_usage"]))
+        event_list.sort(key=lambda event: event[0])
+        time_list = [0.0] + [event[0] for event in event_list]
+        cpu_used_list = list(itertools.accumulate([0.0] + [event[1] for event in event_list]))
+        return time_list, cpu_used_list
+
+    def write_chrome_trace(self, trace_path):
+        """ Write the timeline of the last batch in the Chrome trace event format, one thread per
+            cpu slot, to be opened in chrome://tracing or https://ui.perfetto.dev.
+        """
+        event_list = []
+        for timeline_dict in self.timeline_list:
+            launch_time = (timeline_dict["launch_time"] - self.timeline_start_time) * 1e6
+            end_time = timeline_dict["finish_time"] if timeline_dict["finish_time"] is not None else time.time()
+            arg_dict = {"job": timeline_dict["job"] + 1, "cpu_usage": timeline_dict["cpu_usage"],
+                        "returncode": timeline_dict["returncode"]}
+            for slot in timeline_dict["slot_list"]:
+                event_list.append({"name": timeline_dict["label"], "cat": "job", "ph": "X", "pid": 1, "tid": slot,
+                                   "ts": launch_time, "dur": (end_time - timeline_dict["launch_time"]) * 1e6,
+                                   "args": arg_dict})
+                if timeline_dict["kill_time"] is not None:
+                    event_list.append({"name": "timeout kill", "cat": "job", "ph": "i", "s": "t", "pid": 1, "tid": slot,
+                                       "ts": (timeline_dict["kill_time"] - self.timeline_start_time) * 1e6,
+                                       "args": arg_dict})
+        for event_time, cpu_used in zip(*self.get_cpu_utilisation_curve()):
+            event_list.append({"name": "cpus in use", "ph": "C", "pid": 1, "ts": event_time * 1e6,
+                               "args": {"cpus": float(cpu_used)}})
+        for slot in range(self.slot_number):
+            event_list.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": slot, "args": {"name": "cpu {}".format(slot)}})
+        with open(trace_path, 'w') as trace_file:
+            json.dump({"traceEvents": event_list, "displayTimeUnit": "ms"}, trace_file)
+
+    def plot_timeline(self, figure_path):
+        """ Save a Gantt chart of the last batch, one row per cpu slot, above the number of cpus in use.
+            Green jobs succeeded, red ones failed and orange ones were killed on timeout.
+        """
+        # Loaded here only, they take longer to import than the scheduler needs to start
+        import matplotlib
+        matplotlib.use('agg')
+        import matplotlib.pyplot as plt
+        import matplotlib.gridspec as gridspec
+        fig = plt.figure(figsize=(12, 2 + 0.3 * self.slot_number))
+        grid = gridspec.GridSpec(2, 1, height_ratios=[3, 1], hspace=0.1)
+        gantt_axis = fig.add_subplot(grid[0])
+        cpu_axis = fig.add_subplot(grid[1], sharex=gantt_axis)
+        for timeline_dict in self.timeline_list:
+            if timeline_dict["finish_time"] is None:
+                continue
+            if timeline_dict["kill_time"] is not None:
+                color = "tab:orange"
+            elif timeline_dict["returncode"] == 0:
+                color = "tab:green"
+            else:
+                color = "tab:red"
+            launch_time = timeline_dict["launch_time"] - self.timeline_start_time
+            for slot in timeline_dict["slot_list"]:
+                gantt_axis.broken_barh([(launch_time, timeline_dict["finish_time"] - timeline_dict["launch_time"])],
+                                       (slot - 0.4, 0.8), facecolors=color, edgecolors="black", linewidth=0.5)
+            gantt_axis.text(launch_time, timeline_dict["slot_list"][0], " {}".format(timeline_dict["job"] + 1),
+                            va="center", fontsize=7)
+        gantt_axis.set_yticks(range(self.slot_number))
+        gantt_axis.set_ylim(-0.5, self.slot_number - 0.5)
+        gantt_axis.invert_yaxis()
+        gantt_axis.set_ylabel("cpu slot")
+        plt.setp(gantt_axis.get_xticklabels(), visible=False)
+        time_list, cpu_used_list = self.get_cpu_utilisation_curve()
+        cpu_axis.step(time_list, cpu_used_list, where="post")
+        cpu_axis.axhline(self.cpu_provided, color="gray", linestyle="--")
+        cpu_axis.set_ylim(0, max(self.cpu_provided, max(cpu_used_list)) * 1.1)
+        cpu_axis.set_xlabel("time since the batch started (s)")
+        cpu_axis.set_ylabel("cpus in use")
+        fig.savefig(figure_path, bbox_inches="tight")
+        plt.close(fig)
+
     def run_all_for_executable(self,
                                log_file_path=None,
-                               timeout=None):
+                               timeout=None,
+                               stream_output=False,
+                               job_log_dir=None,
+                               output_tail_size=65536,
+                               pin_cores=False,
+                               batch_runtime=None,
+                               kill_grace_period=10.0,
+                               speculation_factor=None):
+        """ Run all jobs, with at most cpu_provided cpus in use at the same time.
+
+            Every job runs in a session of its own. A job still running timeout seconds after its
+            launch gets SIGTERM, sent to its whole process group, then SIGKILL kill_grace_period
+            seconds later if it has not exited, so the wrappers and the processes they started
+            all give back their cpus.
+
+            By default the outputs of a job are read once it has exited. With stream_output
+            (implied by job_log_dir) the pipes are drained while the job runs: the full outputs
+            go to job_<n>.stdout.log / job_<n>.stderr.log in job_log_dir, and only the last
+            output_tail_size bytes of each stream are written to the log file.
+
+            With pin_cores (Linux only) every job is bound to as many cores as its cpu usage,
+            disjoint from the cores of the other jobs and taken from one NUMA node when possible.
+
+            With batch_runtime (seconds) the jobs estimated shorter than it (see input_runtime_list
+            and history) are grouped, with the queued short jobs using the same resources, into
+            batches of about batch_runtime run by a single process, which saves a launch and a wait
+            per job on large sweeps. Each job still gets its own timeout, outputs and returncode.
+
+            With speculation_factor, once no job is queued, a job running speculation_factor times
+            longer than expected (its estimate, else the median wall time of the jobs finished so
+            far) is started again on the free cpus. The copy finishing first is kept and the other
+            one killed, so only use it for jobs giving the same results when run twice at the same
+            time (no shared output files). A copy writes its job log files with a .copy suffix.
+
+            The launch, kill and finish times of the jobs are kept in timeline_list, with the cpu
+            slots they used. Export them with write_chrome_trace() or plot_timeline().
+        """
         print(time.time())
         print("    Running the given {0} jobs on given {1} cpus ...".format(len(self.job_list), self.cpu_provided))
+        self.open_run(log_file_path, timeout, stream_output, job_log_dir, output_tail_size, pin_cores, batch_runtime,
+                      kill_grace_period, speculation_factor)
+        if self.history is not None:
+            makespan, unknown_job_number = self.estimate_makespan()
+            if makespan is not None:
+                print("    Estimated makespan: {0:.1f} s ({1} jobs without history)".format(makespan, unknown_job_number))
+
+        self.queued_job_index_list = self.scheduling_policy.sort_queue(self, list(range(len(self.job_list))))
+        if self.journal is not None:
+            self.resume_from_journal()
+        try:
+            self.init_dependency_state()
+            self.fill_queue()
+            while self.queued_job_index_list or self.working_job_list:
+                self.launch_selected_jobs()
+                self.launch_speculative_jobs()
+                if self.working_job_list:
+                    self.wait_for_working_jobs()
+                self.fill_queue()
+        finally:
+            # Only left with working jobs when stopped early
+            if self.working_job_list:
+                print("<?> The run stopped early, its {} working jobs are terminated!".format(len(self.working_job_list)))
+                self.terminate_working_jobs()
+            self.close_run()
+
+        if self.skipped_job_set:
+            print("<?> {0} jobs were skipped, a job they depend on failed!".format(len(self.skipped_job_set)))
+        time_list, cpu_used_list = self.get_cpu_utilisation_curve()
+        if len(time_list) > 1 and time_list[-1] > 0:
+            cpu_time = sum((end_time - start_time) * cpu_used
+                           for start_time, end_time, cpu_used in zip(time_list, time_list[1:], cpu_used_list))
+            print("    The average cpu utilisation is: {:.1f} %".format(
+                100.0 * cpu_time / (time_list[-1] * self.cpu_provided)))
+        print("    All {0} jobs have been run on given {1} cpus...".format(len(self.job_list), self.cpu_provided))
+        print(time.time())
+
+    def open_run(self, log_file_path=None, timeout=None, stream_output=False, job_log_dir=None, output_tail_size=65536,
+                 pin_cores=False, batch_runtime=None, kill_grace_period=10.0, speculation_factor=None):
+        """ Set the options of run_all_for_executable and get the runner ready to launch jobs. """
         if log_file_path is not None:
-            my_log_file = open(log_file_path, 'w')
+            self.log_file = open(log_file_path, 'w')
         else:
-            my_log_file = None
-
+            self.log_file = None
+        self.timeout = timeout
+        self.kill_grace_period = kill_grace_period
+        self.deadline_heap = []
+        self.stream_output = stream_output or job_log_dir is not None
+        self.job_log_dir = job_log_dir
+        self.output_tail_size = output_tail_size
+        self.batch_runtime = batch_runtime
+        self.speculation_factor = speculation_factor
+        if speculation_factor is not None and not self.is_speculation_supported:
+            print("<?> The jobs of {} cannot be run twice, speculation is off!".format(type(self).__name__))
+            self.speculation_factor = None
+        self.speculative_job_dict = {}
+        self.copy_process_set = set()
+        self.discarded_process_set = set()
+        self.finished_wall_time_list.clear()
+        if job_log_dir is not None:
+            os.makedirs(job_log_dir, exist_ok=True)
+        self.core_placement = ideas1_core_placement() if pin_cores else None
+        if self.core_placement is not None and self.core_placement.get_free_core_number() < self.cpu_provided:
+            print("<?> The number of available cpus is more than the cores that can be pinned!")
+        if self.cpu_controller is not None:
+            self.cpu_provided = self.cpu_controller.start()
         self.cpu_used = 0
-        for i in range(len(self.job_list)):
-            self.cpu_used += self.cpu_usage_list[i]
-            while np.greater(self.cpu_used, self.cpu_provided):
-                for j in range(len(self.working_job_list)):
-                    if self.working_job_end_time_list[j] < time.time():
-                        self.working_job_list[j].kill()
-                    if self.working_job_list[j].poll() is not None:
-                        self.log_process_output(self.working_job_list.pop(j), my_log_file)
-                        self.cpu_used -= self.working_job_cpu_usage_list.pop(j)
-                        self.working_job_end_time_list.pop(j)
-                        break
-            print("    |  ({0}/{1}) Run job: {2}".format(i+1, len(self.job_list), self.input_job_list[i]))
-            # print("    |  The number of used cpus: {}".format(self.cpu_used))
-            # print("    |  The number of available cpus: {}".format(self.cpu_provided-self.cpu_used))
-            self.working_job_list.append(subprocess.Popen(self.job_list[i],
-                                                          stdout=subprocess.PIPE,
-                                                          stderr=subprocess.PIPE,
-                                                          env=self.env))
-            self.working_job_cpu_usage_list.append(self.cpu_usage_list[i])
-            self.working_job_end_time_list.append(time.time() + timeout)
-        for job_i in self.working_job_list:
-            try:
-                job_i.wait(timeout=timeout)
-            except subprocess.TimeoutExpired:
-                job_i.kill()
-        while np.greater(self.cpu_used, 0):
-            for j in range(len(self.working_job_list)):
-                if self.working_job_list[j].poll() is not None:
-                    self.log_process_output(self.working_job_list.pop(j), my_log_file)
-                    self.cpu_used -= self.working_job_cpu_usage_list.pop(j)
-                    break
+        self.launched_job_count = 0
+        # The history records the peak memory of the jobs, sampled by the telemetry when there is one
+        self.is_peak_memory_sampled = self.history is not None and self.telemetry is None
+        if self.memory_provided is not None or self.is_peak_memory_sampled:
+            self.memory_sample_time = time.time() + self.memory_sample_interval
+        else:
+            self.memory_sample_time = None
+        self.watcher = self.create_watcher()
+        self.timeline_list = []
+        self.timeline_start_time = time.time()
+        self.free_slot_list = list(range(math.ceil(self.cpu_provided)))
+        self.slot_number = len(self.free_slot_list)
+        if self.telemetry is not None:
+            self.telemetry.start()
 
-        if my_log_file is not None:
-            my_log_file.close()
+    def close_run(self):
+        self.watcher.close()
+        if self.journal is not None:
+            self.journal.close()
+        if self.telemetry is not None:
+            self.telemetry.finish()
+        if self.cpu_controller is not None:
+            self.cpu_controller.finish()
+            self.cpu_provided = self.cpu_controller.cpu_ceiling
 
-        print("    All {0} jobs have been run on given {1} cpus...".format(len(self.job_list), self.cpu_provided))
-        print(time.time())
+        if self.log_file is not None:
+            self.log_file.close()
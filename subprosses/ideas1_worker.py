@@ -0,0 +1,91 @@
+#!/usr/bin/python -3.6
+# ‐*‐ coding: utf‐8 ‐*‐
+
+import ast
+import base64
+import importlib
+import json
+import os
+import sys
+import tempfile
+import traceback
+
+
+def parse_argument(text):
+    """ Read an argument as a Python literal ("1", "2.5", "[1, 2]" ...), or keep it as a string. """
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def read_tail(output_file, tail_size):
+    output_file.seek(0, os.SEEK_END)
+    if tail_size is not None:
+        output_file.seek(max(output_file.tell() - tail_size, 0))
+    else:
+        output_file.seek(0)
+    return output_file.read()
+
+
+def run_callable(message, stderr_fd):
+    """ Run the job of a run message in this worker, with its outputs sent to files at the
+        file descriptor level, so the outputs of C extensions are caught too.
+    """
+    output_file_list = [open(path, 'w+b') if path is not None else tempfile.TemporaryFile()
+                        for path in (message["stdout_path"], message["stderr_path"])]
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(output_file_list[0].fileno(), 1)
+    os.dup2(output_file_list[1].fileno(), 2)
+    try:
+        module_name, function_name = message["command"][0].split(":")
+        function = getattr(importlib.import_module(module_name), function_name)
+        function(*[parse_argument(text) for text in message["command"][1:]])
+        returncode = 0
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            returncode = error.code or 0
+        else:
+            print(error.code, file=sys.stderr)
+            returncode = 1
+    except BaseException:
+        traceback.print_exc()
+        returncode = 1
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        null_fd = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(null_fd, 1)
+        os.close(null_fd)
+        os.dup2(stderr_fd, 2)
+    output_list = [read_tail(output_file, message["tail_size"]) for output_file in output_file_list]
+    for output_file in output_file_list:
+        output_file.close()
+    return returncode, output_list
+
+
+def serve_worker(preload_module_list):
+    """ Main loop of a pool worker: read run messages on stdin, answer done messages on stdout. """
+    sys.path.insert(0, os.getcwd())
+    for module_name in preload_module_list:
+        importlib.import_module(module_name)
+    # Keep the messages away from the jobs, which get /dev/null as stdin
+    command_file = os.fdopen(os.dup(0), 'r')
+    message_file = os.fdopen(os.dup(1), 'w')
+    stderr_fd = os.dup(2)
+    null_fd = os.open(os.devnull, os.O_RDWR)
+    os.dup2(null_fd, 0)
+    os.dup2(null_fd, 1)
+    os.close(null_fd)
+    for line in command_file:
+        returncode, output_list = run_callable(json.loads(line), stderr_fd)
+        message_file.write(json.dumps({"type": "done", "returncode": returncode,
+                                       "outputs": [base64.b64encode(output).decode("ascii")
+                                                   for output in output_list]}) + "\n")
+        message_file.flush()
+
+
+if __name__ == "__main__":
+    # Started by ideas1_pool_worker with the modules to preload, kept free of heavy imports
+    serve_worker(sys.argv[1:])